@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import deque
+
+# Serving modes, lightest shedding first, and the model stages each one skips
+MODES = ("full", "no_zero_shot", "keyword_only")
+SHED_STAGES = {
+    "full": (),
+    "no_zero_shot": ("zero_shot",),
+    "keyword_only": ("zero_shot", "emotion_model"),
+}
+
+
+class WindowedMean:
+    """Mean of the samples observed in the last `window_seconds`.
+
+    Samples are kept in a deque with a running sum and dropped from the
+    front as they age out (or past `max_samples`), so observe() and mean()
+    are amortized O(1).
+    """
+
+    def __init__(self, window_seconds: float, max_samples: int = 4096):
+        self.window_seconds = window_seconds
+        self.max_samples = max_samples
+        self.samples = deque()
+        self.total = 0.0
+
+    def _expire(self, now: float):
+        samples = self.samples
+        while samples and (now - samples[0][0] > self.window_seconds or len(samples) > self.max_samples):
+            self.total -= samples.popleft()[1]
+
+    def observe(self, value: float, now: float):
+        self.samples.append((now, value))
+        self.total += value
+        self._expire(now)
+
+    def clear(self):
+        self.samples.clear()
+        self.total = 0.0
+
+    def mean(self, now: float):
+        """(mean, count) over the window; (0.0, 0) without samples"""
+        self._expire(now)
+        count = len(self.samples)
+        return (self.total / count if count else 0.0), count
+
+
+class OverloadController:
+    """Switches new requests to cheaper serving modes while inference is overloaded.
+
+    Watches how long calls wait for an inference worker and how long the
+    model stages take, each as a mean over the last `window_seconds`.
+    Pressure is the largest of those means relative to its threshold,
+    counting only stages the current mode still runs (a shed stage has no
+    fresh samples). Pressure of 1 or more moves one mode down MODES (first
+    zero-shot is skipped, then the emotion model), at most once per
+    `escalate_seconds` so each step gets a chance to relieve the pool.
+    Recovery is one mode at a time too, and only after pressure has stayed
+    below `recover_ratio` for `recover_seconds`, so the mode doesn't flap
+    around the threshold. The windows restart on every transition: a mode
+    is judged only on samples taken while it was active.
+    """
+
+    def __init__(self, queue_delay_ms: float = 200, stage_latency_ms=None, window_seconds: float = 5,
+                 min_samples: int = 5, escalate_seconds: float = 2, recover_ratio: float = 0.5,
+                 recover_seconds: float = 10, on_transition=None):
+        self.thresholds = {"queue_delay": queue_delay_ms / 1000.0}
+        for stage, threshold_ms in (stage_latency_ms or {}).items():
+            if threshold_ms > 0:
+                self.thresholds[stage] = threshold_ms / 1000.0
+        if queue_delay_ms <= 0:
+            del self.thresholds["queue_delay"]
+        self.signals = {name: WindowedMean(window_seconds) for name in self.thresholds}
+        self.min_samples = min_samples
+        self.escalate_seconds = escalate_seconds
+        self.recover_ratio = recover_ratio
+        self.recover_seconds = recover_seconds
+        self.on_transition = on_transition
+        self.level = 0
+        self.changed_at = time.monotonic()
+        self.calm_since = None
+        self.transitions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def mode(self) -> str:
+        return MODES[self.level]
+
+    def observe(self, signal: str, seconds: float):
+        """Record a queue delay ("queue_delay") or a stage latency (the stage name)"""
+        window = self.signals.get(signal)
+        if window is not None:
+            with self._lock:
+                window.observe(seconds, time.monotonic())
+
+    def _pressure(self, now: float):
+        shed = SHED_STAGES[MODES[self.level]]
+        pressure = 0.0
+        for name, window in self.signals.items():
+            mean, count = window.mean(now)
+            if name not in shed and count >= self.min_samples:
+                pressure = max(pressure, mean / self.thresholds[name])
+        return pressure
+
+    def _move(self, level: int, now: float):
+        previous = MODES[self.level]
+        self.level = level
+        self.changed_at = now
+        self.calm_since = None
+        for window in self.signals.values():
+            window.clear()
+        key = (previous, MODES[level])
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        return previous
+
+    def shed_stages(self):
+        """Model stages new requests skip in the current mode; re-evaluates the mode first"""
+        now = time.monotonic()
+        transition = None
+        with self._lock:
+            pressure = self._pressure(now)
+            if pressure >= 1.0:
+                self.calm_since = None
+                if self.level < len(MODES) - 1 and now - self.changed_at >= self.escalate_seconds:
+                    transition = (self._move(self.level + 1, now), self.mode)
+            elif pressure < self.recover_ratio and self.level > 0:
+                if self.calm_since is None:
+                    self.calm_since = now
+                elif now - self.calm_since >= self.recover_seconds:
+                    transition = (self._move(self.level - 1, now), self.mode)
+            else:
+                self.calm_since = None
+            mode = self.mode
+        if transition is not None:
+            print(f"Serving mode {transition[0]} -> {transition[1]} (pressure {pressure:.2f})")
+            if self.on_transition is not None:
+                self.on_transition(*transition)
+        return SHED_STAGES[mode]
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            signals = {}
+            for name, window in self.signals.items():
+                mean, count = window.mean(now)
+                signals[name] = {
+                    "mean_ms": round(mean * 1000.0, 3),
+                    "threshold_ms": round(self.thresholds[name] * 1000.0, 3),
+                    "samples": count,
+                }
+            return {
+                "mode": self.mode,
+                "shed_stages": list(SHED_STAGES[self.mode]),
+                "pressure": round(self._pressure(now), 3),
+                "seconds_in_mode": round(now - self.changed_at, 3),
+                "signals": signals,
+                "transitions": {f"{source}->{target}": count for (source, target), count in self.transitions.items()},
+            }
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Per-request cost of ranked dialogue selection as the dataset grows.
+
+Builds a synthetic dataset of N dialogue lines spread over the dataset's
+emotions (or all in one emotion with --single-emotion, the worst case),
+writes a random float32 embedding matrix of the given width to disk and
+memory-maps it like the server does, then times CelebrityIndex.pick_ranked()
+against the uniform pick(). Query embedding is not included: it is one
+encoder pass per message, the same at any dataset size.
+
+--check instead runs ranking end to end on the real dataset with the local
+HashingEmbedder: every dialogue line, used as the query, must be ranked
+first in its emotion, and a second EmbeddingStore pass over unchanged
+lines must embed nothing.
+
+    python benchmark_dialogue_ranking.py
+    python benchmark_dialogue_ranking.py --lines 10000 50000 --dim 384 --single-emotion
+    python benchmark_dialogue_ranking.py --check
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from celebrity_index import CelebrityIndex, dialogue_texts
+from dataset_store import load_dataset
+from dialogue_ranking import EmbeddingStore, HashingEmbedder
+
+
+def synthetic_dataset(emotions, lines: int):
+    dataset = {emotion: {} for emotion in emotions}
+    for i in range(lines):
+        emotion = emotions[i % len(emotions)]
+        dataset[emotion][f"celebrity{i}"] = {"text": f"line {i}", "image": "", "audio": ""}
+    return dataset
+
+
+def check_ranking(dataset):
+    embedder = HashingEmbedder()
+    texts = dialogue_texts(dataset)
+    with tempfile.TemporaryDirectory() as directory:
+        store = EmbeddingStore(directory)
+        index = CelebrityIndex(dataset, embeddings=store.matrix(texts, embedder))
+
+        embedded = []
+        embed = embedder.embed
+        embedder.embed = lambda batch: embedded.append(len(batch)) or embed(batch)
+        again = store.matrix(texts, embedder)
+        assert not embedded, f"{sum(embedded)} unchanged lines were embedded again"
+        assert np.array_equal(again, index.embeddings)
+
+        for emotion, celebrities in dataset.items():
+            for celebrity, response in celebrities.items():
+                query = embedder.embed([response["text"]])[0]
+                best = index.pick_ranked(emotion, query, top_k=1)
+                assert best["response"]["text"] == response["text"], (
+                    f"{emotion}/{celebrity}: ranked {best['celebrity']} first"
+                )
+    print(f"ok: {len(texts)} lines each ranked first for their own text, no re-embedding on reload")
+
+
+def bench(fn, labels, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(labels[i % len(labels)])
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--dim", type=int, default=384, help="embedding width (all-MiniLM-L6-v2: 384)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--single-emotion", action="store_true", help="put every line in one emotion")
+    parser.add_argument("--check", action="store_true", help="check ranking with HashingEmbedder and exit")
+    args = parser.parse_args()
+
+    dataset, _ = load_dataset()
+    if args.check:
+        check_ranking(dataset)
+        return
+    emotions = ["greeting"] if args.single_emotion else sorted(dataset)
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=args.dim).astype(np.float32)
+    query /= np.linalg.norm(query)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for lines in args.lines:
+            synthetic = synthetic_dataset(emotions, lines)
+            matrix = rng.normal(size=(lines, args.dim)).astype(np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+            path = os.path.join(directory, f"{lines}.npy")
+            np.save(path, matrix)
+            index = CelebrityIndex(synthetic, embeddings=np.load(path, mmap_mode="r"))
+
+            picker = random.Random(0)
+            uniform_us = bench(lambda label: index.pick(label, picker), emotions, args.iterations)
+            ranked_us = bench(lambda label: index.pick_ranked(label, query, args.top_k, picker), emotions, args.iterations)
+            per_label = lines // len(emotions)
+            print(f"{lines:>7} lines ({per_label:>6}/emotion)  uniform {uniform_us:7.2f} us  ranked {ranked_us:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark the keyword matcher against the old per-rule
+`any(word in text_lower ...)` loops and the trie-shaped alternation regex
+it replaced, on short and long inputs.
+"""
+
+import random
+import re
+import timeit
+
+from keyword_rules import CELEBRITY_KEYWORD_RULES, CELEBRITY_KEYWORD_MATCHER
+
+# Filler words that contain none of the keywords, even as substrings
+FILLER_WORDS = [
+    "quick", "brown", "fox", "jumps", "over", "lazy", "cat", "trying", "plenty",
+    "of", "text", "we", "can", "put", "on", "record", "today", "weather", "box",
+]
+
+
+def legacy_match(text: str):
+    """The substring loops the classifier used before the compiled matcher"""
+    text_lower = text.lower()
+    for label, keywords in CELEBRITY_KEYWORD_RULES:
+        if any(word.rstrip('*') in text_lower for word in keywords):
+            return label
+    return None
+
+
+def _trie_pattern(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = [(r'\s+' if char == ' ' else re.escape(char)) + build(node[char]) for char in sorted(k for k in node if k)]
+        if not branches:
+            return ''
+        body = '(?:' + '|'.join(branches) + ')' if len(branches) > 1 else branches[0]
+        return '(?:' + body + ')?' if '' in node else body
+
+    return build(trie)
+
+
+def regex_matcher(rules):
+    """The single word-boundary regex the matcher used before: one
+    alternation tried at every position of the text"""
+    exact, prefixes = {}, {}
+    for priority, (label, keywords) in enumerate(rules):
+        for keyword in keywords:
+            keyword = ' '.join(keyword.lower().split())
+            if keyword.endswith('*'):
+                prefixes.setdefault(keyword[:-1], priority)
+            else:
+                exact.setdefault(keyword, priority)
+    pattern = re.compile(r'\b(?:' + _trie_pattern(exact) + '|' + _trie_pattern(prefixes) + r'\w*)\b')
+
+    def match(text: str):
+        best = None
+        for found in pattern.finditer(text.lower()):
+            found = ' '.join(found.group().split())
+            priority = exact.get(found)
+            if priority is None:
+                priority = min((p for prefix, p in prefixes.items() if found.startswith(prefix)), default=None)
+            if priority is not None and (best is None or priority < best):
+                best = priority
+        return rules[best][0] if best is not None else None
+
+    return match
+
+
+regex_match = regex_matcher(CELEBRITY_KEYWORD_RULES)
+
+
+def compiled_match(text: str):
+    match = CELEBRITY_KEYWORD_MATCHER.match(text)
+    return match.label if match else None
+
+
+def make_text(words: int, keyword: str = None, varied: bool = False):
+    """Filler text; `varied` draws from a few thousand made-up words
+    (like real prose) instead of FILLER_WORDS"""
+    rng = random.Random(words)
+    if varied:
+        vocabulary = ["".join(rng.choice("bcdfgjkpqvxz") for _ in range(rng.randint(2, 9))) for _ in range(3000)]
+        vocabulary = [word + rng.choice(["", "", ",", "."]) for word in vocabulary]
+    else:
+        vocabulary = FILLER_WORDS
+    tokens = [rng.choice(vocabulary) for _ in range(words)]
+    if keyword:
+        tokens.append(keyword)
+    return " ".join(tokens)
+
+
+def bench(fn, text: str, number: int):
+    """Best of five runs, in microseconds per call"""
+    return min(timeit.repeat(lambda: fn(text), number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    cases = [
+        ("short, keyword hit", "im sad today", 20000),
+        ("short, no hit", "what a strange thing to say", 20000),
+        ("200 words, no hit", make_text(200), 2000),
+        ("2000 words, no hit", make_text(2000), 200),
+        ("2000 words, last-rule hit", make_text(2000, "melody"), 200),
+        ("2000 varied words, no hit", make_text(2000, varied=True), 200),
+        ("20000 words, no hit", make_text(20000), 20),
+        ("20000 varied words, no hit", make_text(20000, varied=True), 20),
+    ]
+
+    for name, text, _ in cases:
+        assert compiled_match(text) == regex_match(text), name
+
+    print(f"{'case':<28}{'legacy us':>11}{'regex us':>10}{'words us':>10}{'vs legacy':>11}{'vs regex':>10}")
+    for name, text, number in cases:
+        legacy = bench(legacy_match, text, number)
+        regex = bench(regex_match, text, number)
+        compiled = bench(compiled_match, text, number)
+        print(f"{name:<28}{legacy:>11.1f}{regex:>10.1f}{compiled:>10.1f}{legacy / compiled:>10.2f}x{regex / compiled:>9.2f}x")
+
+    # Show the false hits the substring loops used to produce
+    for text in ["this is it", "let me translate that", "the ego trip"]:
+        print(f"{text!r}: legacy={legacy_match(text)} compiled={compiled_match(text)}")
+
+
+if __name__ == "__main__":
+    main()
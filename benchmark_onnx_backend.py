@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Accuracy parity, latency and memory of the inference backends.
+
+Each configuration runs in a fresh process so its RSS is measured in
+isolation. Both models are run over a fixed test set, and top-1 labels
+are compared against the stock transformers pipelines
+(`pipeline("text-classification")` and `pipeline("zero-shot-classification")`),
+which always run first as the reference. "torch" is what the server runs
+with the PyTorch backend (zero-shot through BatchedZeroShotClassifier);
+the onnx configurations wrap the ONNX pipelines the same way. Texts whose
+label differs from the reference are listed after the table.
+
+    pip install onnx onnxruntime
+    python benchmark_onnx_backend.py
+"""
+
+import argparse
+import multiprocessing
+import statistics
+import time
+
+EMOTION_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+ZERO_SHOT_MODEL = "facebook/bart-large-mnli"
+
+ZERO_SHOT_LABELS = [
+    "advice", "bye", "greet", "insult", "joke", "random", "song", "story", "thanks"
+]
+
+TEST_TEXTS = [
+    "im so happy today", "this is the worst day of my life", "i cant believe you did that",
+    "i am terrified of the exam tomorrow", "i love you so much", "wow i did not expect that",
+    "ok", "whatever you say", "what should i do about my exams", "catch you tomorrow",
+    "you are the worst bot ever", "tell me something that makes me laugh",
+    "the sky is purple on tuesdays", "can you hum something for me",
+    "once upon a time there was a king", "really appreciate it",
+    "i miss my friends back home", "why does nobody listen to me",
+    "that was a brilliant goal", "not sure how i feel about this",
+]
+
+CONFIGS = {
+    "stock": {"backend": "stock", "quantize": False},
+    "torch": {"backend": "torch", "quantize": False},
+    "onnx-fp32": {"backend": "onnx", "quantize": False},
+    "onnx-int8": {"backend": "onnx", "quantize": True},
+}
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_config(config):
+    from model_loading import load_pipeline
+    from zero_shot import BatchedZeroShotClassifier
+
+    base_rss = rss_mb()
+    start = time.perf_counter()
+    if config["backend"] == "stock":
+        from transformers import pipeline
+
+        emotion = pipeline("text-classification", model=EMOTION_MODEL)
+        zero_shot = pipeline("zero-shot-classification", model=ZERO_SHOT_MODEL)
+    else:
+        emotion = load_pipeline("text-classification", EMOTION_MODEL, **config)
+        zero_shot = BatchedZeroShotClassifier(load_pipeline("zero-shot-classification", ZERO_SHOT_MODEL, **config))
+    load_s = time.perf_counter() - start
+    # load_pipeline falls back to PyTorch if ONNX fails; report what actually ran
+    pipelines = f"{type(emotion).__name__}, {type(getattr(zero_shot, 'pipe', zero_shot)).__name__}"
+
+    emotion(TEST_TEXTS[0])
+    zero_shot(TEST_TEXTS[0], candidate_labels=ZERO_SHOT_LABELS)
+
+    emotion_labels, emotion_ms, zero_shot_labels, zero_shot_ms = [], [], [], []
+    for text in TEST_TEXTS:
+        start = time.perf_counter()
+        emotion_labels.append(emotion(text)[0]["label"])
+        emotion_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        zero_shot_labels.append(zero_shot(text, candidate_labels=ZERO_SHOT_LABELS)["labels"][0])
+        zero_shot_ms.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "pipelines": pipelines,
+        "load_s": load_s,
+        "rss_mb": rss_mb() - base_rss,
+        "emotion_labels": emotion_labels,
+        "emotion_ms": emotion_ms,
+        "zero_shot_labels": zero_shot_labels,
+        "zero_shot_ms": zero_shot_ms,
+    }
+
+
+def p95(values):
+    values = sorted(values)
+    return values[int(0.95 * (len(values) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for name in dict.fromkeys(["stock"] + args.configs):
+        print(f"Running {name}...")
+        with ctx.Pool(1) as pool:
+            results[name] = pool.apply(run_config, (CONFIGS[name],))
+
+    reference = results["stock"]
+    print(f"\n{'config':<11}{'load s':>8}{'RSS MB':>9}{'emo ms':>9}{'emo p95':>9}{'emo agree':>11}"
+          f"{'zs ms':>9}{'zs p95':>9}{'zs agree':>10}  pipelines")
+    disagreements = []
+    for name, r in results.items():
+        agree = {}
+        for model in ("emotion", "zero_shot"):
+            pairs = list(zip(TEST_TEXTS, r[f"{model}_labels"], reference[f"{model}_labels"]))
+            agree[model] = sum(label == expected for _, label, expected in pairs) / len(TEST_TEXTS)
+            disagreements += [(name, model, text, label, expected) for text, label, expected in pairs if label != expected]
+        print(f"{name:<11}{r['load_s']:>8.1f}{r['rss_mb']:>9.0f}"
+              f"{statistics.mean(r['emotion_ms']):>9.1f}{p95(r['emotion_ms']):>9.1f}{agree['emotion']:>11.0%}"
+              f"{statistics.mean(r['zero_shot_ms']):>9.1f}{p95(r['zero_shot_ms']):>9.1f}{agree['zero_shot']:>10.0%}"
+              f"  {r['pipelines']}")
+
+    if disagreements:
+        print("\nLabels that differ from the stock pipelines:")
+        for name, model, text, label, expected in disagreements:
+            print(f"  {name:<11}{model:<11}{text!r}: {label} (stock: {expected})")
+
+
+if __name__ == "__main__":
+    main()
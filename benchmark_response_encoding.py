@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Per-request serialization cost of a /predict response.
+
+"dict" is what FastAPI did before: jsonable_encoder() over the response
+dict, then JSONResponse.render() (json.dumps). "spliced" encodes only the
+input text and emotion and appends the entry's pre-encoded fragment, with
+orjson when it is installed.
+
+    pip install orjson   # optional
+    python benchmark_response_encoding.py
+"""
+
+import argparse
+import json
+import random
+import time
+
+from celebrity_index import CelebrityIndex
+from dataset_store import load_dataset
+from response_encoding import JSON_LIBRARY, encode_fragment, encode_prediction
+
+try:
+    from fastapi.encoders import jsonable_encoder
+except ImportError:
+    def jsonable_encoder(obj):
+        return obj
+
+TEXTS = ["hi", "im so happy today", "this is the worst day of my life " * 4, "tell me a joke 😂"]
+
+
+def fragment(entry):
+    response = entry["response"]
+    return encode_fragment(entry["celebrity"], response["image"], response["text"], response["audio"])
+
+
+def encode_dict(text, emotion, entry):
+    content = {
+        "input": text,
+        "predicted_emotion": emotion,
+        "stage": "emotion_model",
+        "degraded": False,
+        "celebrity": entry["celebrity"],
+        "image_url": entry["response"]["image"],
+        "dialogue_text": entry["response"]["text"],
+        "audio_url": entry["response"]["audio"],
+    }
+    # Same as starlette's JSONResponse.render
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def encode_spliced(text, emotion, entry):
+    return encode_prediction(text, emotion, "emotion_model", False, entry["fragment"])
+
+
+def bench(encode, cases, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text, emotion, entry in cases:
+            encode(text, emotion, entry)
+    return (time.perf_counter() - start) / (iterations * len(cases)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    dataset, _ = load_dataset()
+    index = CelebrityIndex(dataset, fragment=fragment)
+    rng = random.Random(0)
+    emotions = list(dataset)
+    cases = []
+    for _ in range(64):
+        emotion = rng.choice(emotions)
+        cases.append((rng.choice(TEXTS), emotion, index.pick(emotion, rng)))
+
+    # Both paths must produce the same JSON document
+    for text, emotion, entry in cases:
+        assert json.loads(encode_dict(text, emotion, entry)) == json.loads(encode_spliced(text, emotion, entry))
+
+    dict_us = bench(encode_dict, cases, args.iterations)
+    spliced_us = bench(encode_spliced, cases, args.iterations)
+    print(f"dict + json.dumps:        {dict_us:6.2f} us/response")
+    print(f"spliced ({JSON_LIBRARY + ')':<7}          {spliced_us:6.2f} us/response  ({dict_us / spliced_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
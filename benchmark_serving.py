@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Load test for the celebrity server: throughput and latency percentiles.
+
+Drives /predict (and optionally /predict/batch and /ws/chat) from
+concurrent keep-alive clients with a seeded mix of keyword hits,
+emotion-model texts, zero-shot-style ambiguous texts and long inputs,
+plus a share of repeated texts that hit the classification cache.
+Latency is reported overall, per input category and per deciding stage
+(X-Emotion-Stage header), next to the server-side classify time from
+Server-Timing. Results are written as JSON; --compare prints the change
+against an earlier run.
+
+    python benchmark_serving.py --spawn stub                  # CI-fast, fake models
+    python benchmark_serving.py --spawn real --requests 500
+    python benchmark_serving.py --url http://127.0.0.1:8000 --endpoints predict batch ws
+    python benchmark_serving.py --spawn stub --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from keyword_rules import CELEBRITY_KEYWORD_MATCHER, CELEBRITY_KEYWORD_RULES
+
+KEYWORD_TEMPLATES = ["{}", "{} there", "i just feel {} right now", "well {} i guess", "{}!!"]
+
+EMOTION_TEXTS = [
+    "this is the worst day of my life", "i cant believe you did that to me",
+    "everything went perfectly at work today", "my cat knocked the plant over again",
+    "nobody showed up to my birthday party", "we finally won the championship",
+    "i failed the driving test for the third time", "the food at that place was disgusting",
+    "my brother got into his dream college", "the power went out in the middle of the match",
+    "i lost my wallet on the bus", "she said yes when i proposed",
+    "there is a spider on my bed", "i got a raise this morning",
+]
+
+ZERO_SHOT_TEXTS = [
+    "ok", "hmm", "whatever you say", "the sky is purple on tuesdays",
+    "can you hum something", "what should i do about my exams", "catch you tomorrow",
+    "you are the worst bot ever", "tell me something about kerala",
+]
+
+CATEGORIES = ("keyword", "emotion", "zero_shot", "long")
+
+
+def build_workload(count: int, seed: int = 0, repeat_ratio: float = 0.2, mix=(0.35, 0.35, 0.2, 0.1)):
+    """Seeded list of (category, text); repeated texts share the same string"""
+    rng = random.Random(seed)
+    keywords = [kw.rstrip("*") for _, kws in CELEBRITY_KEYWORD_RULES for kw in kws]
+    # Keep the non-keyword categories honest: no text may hit a keyword rule
+    emotion_texts = [t for t in EMOTION_TEXTS if CELEBRITY_KEYWORD_MATCHER.match(t) is None]
+    zero_shot_texts = [t for t in ZERO_SHOT_TEXTS if CELEBRITY_KEYWORD_MATCHER.match(t) is None]
+
+    workload = []
+    for i in range(count):
+        if workload and rng.random() < repeat_ratio:
+            workload.append(rng.choice(workload))
+            continue
+        category = rng.choices(CATEGORIES, weights=mix)[0]
+        if category == "keyword":
+            text = rng.choice(KEYWORD_TEMPLATES).format(rng.choice(keywords))
+        elif category == "emotion":
+            text = rng.choice(emotion_texts)
+        elif category == "zero_shot":
+            text = rng.choice(zero_shot_texts)
+        else:
+            text = " ".join(rng.choice(emotion_texts) for _ in range(rng.randint(20, 60)))
+        # Distinct suffix so fresh texts miss the cache (also across seeds)
+        workload.append((category, f"{text} {seed}.{i}"))
+    return workload
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))], 3)
+
+    return {
+        "count": len(values),
+        "mean": round(statistics.mean(values), 3),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(values[-1], 3),
+    }
+
+
+class Client:
+    """One keep-alive HTTP connection per worker thread"""
+
+    def __init__(self, base_url: str, timeout: float = 60.0):
+        parts = urllib.parse.urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, path: str, payload):
+        body = json.dumps(payload).encode("utf-8")
+        for attempt in range(2):
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                self._local.connection = connection
+            try:
+                connection.request("POST", path, body, {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                headers = {name.lower(): value for name, value in response.getheaders()}
+                return response.status, headers, response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+
+def server_timing_ms(headers):
+    """classify duration from a (lower-cased) Server-Timing header, None if absent"""
+    for metric in headers.get("server-timing", "").split(","):
+        name, _, params = metric.strip().partition(";")
+        if name == "classify":
+            for param in params.split(";"):
+                if param.startswith("dur="):
+                    return float(param[4:])
+    return None
+
+
+def run_predict(client: Client, workload, concurrency: int):
+    def one(item):
+        category, text = item
+        start = time.perf_counter()
+        try:
+            status, headers, body = client.post("/predict", {"text": text})
+        except Exception:
+            return {"category": category, "ok": False, "stage": "error", "latency_ms": (time.perf_counter() - start) * 1000.0}
+        latency_ms = (time.perf_counter() - start) * 1000.0
+        stage = headers.get("x-emotion-stage")
+        if status != 200:
+            stage = f"http_{status}"
+        elif stage is None:
+            stage = "fallback" if b'"error"' in body else "unknown"
+        return {
+            "category": category,
+            "ok": status == 200,
+            "stage": stage,
+            "cache": headers.get("x-classification-cache"),
+            "latency_ms": latency_ms,
+            "server_ms": server_timing_ms(headers),
+        }
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        records = list(pool.map(one, workload))
+    return records, time.perf_counter() - start
+
+
+def run_batch(client: Client, workload, concurrency: int, batch_size: int):
+    batches = [workload[i:i + batch_size] for i in range(0, len(workload), batch_size)]
+
+    def one(batch):
+        start = time.perf_counter()
+        try:
+            status, _, _ = client.post("/predict/batch", {"texts": [text for _, text in batch]})
+        except Exception:
+            status = 0
+        return {"ok": status == 200, "stage": "batch", "category": "batch", "items": len(batch),
+                "latency_ms": (time.perf_counter() - start) * 1000.0}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        records = list(pool.map(one, batches))
+    return records, time.perf_counter() - start
+
+
+def run_ws(base_url: str, workload, concurrency: int):
+    """Each connection sends its share of messages one after another; records
+    time to the "prediction" frame"""
+    import websockets
+
+    ws_url = base_url.replace("http://", "ws://").replace("https://", "wss://").rstrip("/") + "/ws/chat"
+    shares = [workload[i::concurrency] for i in range(concurrency)]
+
+    async def connection(share):
+        records = []
+        async with websockets.connect(ws_url) as socket:
+            for i, (category, text) in enumerate(share):
+                start = time.perf_counter()
+                await socket.send(json.dumps({"id": i, "text": text}))
+                frame = json.loads(await socket.recv())
+                records.append({
+                    "category": category,
+                    "ok": frame["type"] == "prediction",
+                    "stage": "ws",
+                    "latency_ms": (time.perf_counter() - start) * 1000.0,
+                })
+        return records
+
+    async def run_all():
+        results = await asyncio.gather(*(connection(share) for share in shares if share))
+        return [record for records in results for record in records]
+
+    start = time.perf_counter()
+    records = asyncio.run(run_all())
+    return records, time.perf_counter() - start
+
+
+def summarize(records, elapsed_s: float, items: int = None):
+    ok = [r for r in records if r["ok"]]
+    summary = {
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "elapsed_s": round(elapsed_s, 3),
+        "throughput_rps": round(len(records) / elapsed_s, 2) if elapsed_s else 0.0,
+        "latency_ms": percentiles([r["latency_ms"] for r in ok]),
+    }
+    if items is not None:
+        summary["items_per_s"] = round(items / elapsed_s, 2) if elapsed_s else 0.0
+    by_category, by_stage = {}, {}
+    for r in ok:
+        by_category.setdefault(r["category"], []).append(r["latency_ms"])
+        # Cache hits and requests that joined an identical in-flight one are timed apart
+        stage = {"hit": "cache", "coalesced": "coalesced"}.get(r.get("cache"), r["stage"])
+        by_stage.setdefault(stage, []).append(r)
+    if len(by_category) > 1:
+        summary["by_category"] = {name: percentiles(values) for name, values in sorted(by_category.items())}
+    if any(r.get("server_ms") is not None for r in ok):
+        summary["by_stage"] = {
+            stage: {
+                "latency_ms": percentiles([r["latency_ms"] for r in stage_records]),
+                "server_classify_ms": percentiles([r["server_ms"] for r in stage_records if r.get("server_ms") is not None]),
+            }
+            for stage, stage_records in sorted(by_stage.items())
+        }
+    return summary
+
+
+def spawn_server(models: str, port: int, ready_timeout: float):
+    """Start the celebrity server with stub or real models and wait for /readyz"""
+    env = dict(os.environ)
+    if models == "stub":
+        env["INFERENCE_BACKEND"] = "stub"
+    env.setdefault("DATASET_WATCH_INTERVAL_S", "0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "emotion_server_with_celebrities:app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    deadline = time.monotonic() + ready_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/readyz")
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"Server not ready after {ready_timeout}s")
+
+
+def compare(previous, current):
+    """Print p50/p95/p99 and throughput changes per endpoint"""
+    print(f"\n{'endpoint':<10}{'metric':<16}{'before':>10}{'after':>10}{'change':>9}")
+    for endpoint, after in current["endpoints"].items():
+        before = previous.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        rows = [("throughput_rps", before["throughput_rps"], after["throughput_rps"])]
+        for q in ("p50", "p95", "p99"):
+            rows.append((f"latency {q} ms", before["latency_ms"].get(q), after["latency_ms"].get(q)))
+        for metric, old, new in rows:
+            if old is None or new is None:
+                continue
+            change = f"{(new - old) / old:+.0%}" if old else "n/a"
+            print(f"{endpoint:<10}{metric:<16}{old:>10.2f}{new:>10.2f}{change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="server to test (ignored with --spawn)")
+    parser.add_argument("--spawn", choices=["stub", "real"], help="start the server with stub or real models")
+    parser.add_argument("--port", type=int, default=8765, help="port for --spawn")
+    parser.add_argument("--ready-timeout", type=float, default=600.0)
+    parser.add_argument("--endpoints", nargs="+", default=["predict"], choices=["predict", "batch", "ws"])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat-ratio", type=float, default=0.2, help="share of requests repeating an earlier text")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    process = None
+    base_url = args.url
+    if args.spawn:
+        process = spawn_server(args.spawn, args.port, args.ready_timeout)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        client = Client(base_url)
+        # Each endpoint gets its own texts so it doesn't start with a cache warmed by another
+        workloads = {
+            endpoint: build_workload(args.requests, args.seed * 100 + i, args.repeat_ratio)
+            for i, endpoint in enumerate(["predict", "batch", "ws"])
+        }
+        workload = workloads["predict"]
+        run_predict(client, build_workload(args.warmup, args.seed * 100 + 99, 0.0), min(args.concurrency, max(1, args.warmup)))
+
+        results = {
+            "config": {
+                "url": base_url,
+                "models": args.spawn or "external",
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "batch_size": args.batch_size,
+                "repeat_ratio": args.repeat_ratio,
+                "seed": args.seed,
+                "mix": {category: sum(1 for c, _ in workload if c == category) for category in CATEGORIES},
+            },
+            "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                     cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "endpoints": {},
+        }
+        if "predict" in args.endpoints:
+            records, elapsed = run_predict(client, workload, args.concurrency)
+            results["endpoints"]["predict"] = summarize(records, elapsed)
+        if "batch" in args.endpoints:
+            records, elapsed = run_batch(client, workloads["batch"], args.concurrency, args.batch_size)
+            results["endpoints"]["batch"] = summarize(records, elapsed, items=args.requests)
+        if "ws" in args.endpoints:
+            try:
+                records, elapsed = run_ws(base_url, workloads["ws"], args.concurrency)
+                results["endpoints"]["ws"] = summarize(records, elapsed)
+            except ImportError:
+                print("Skipping ws: pip install websockets")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'endpoint':<10}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for endpoint, summary in results["endpoints"].items():
+        latency = summary["latency_ms"]
+        print(f"{endpoint:<10}{summary['requests']:>9}{summary['errors']:>8}{summary['throughput_rps']:>9.1f}"
+              f"{latency.get('p50', 0):>9.1f}{latency.get('p95', 0):>9.1f}{latency.get('p99', 0):>9.1f}")
+        for stage, stats in summary.get("by_stage", {}).items():
+            latency = stats["latency_ms"]
+            print(f"  {stage:<17}{latency['count']:>8}{'':>9}{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}")
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
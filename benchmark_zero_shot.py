@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Compare the zero-shot fallback paths on a fixed set of chat messages:
+
+1. the stock pipeline (one NLI pass per candidate label)
+2. BatchedZeroShotClassifier with all labels in one padded batch
+3. BatchedZeroShotClassifier scoring only the top-k labels by prior
+
+Reports mean/p95 latency per text and top-1 agreement with path 1.
+"""
+
+import argparse
+import statistics
+import time
+
+from transformers import pipeline
+
+from zero_shot import BatchedZeroShotClassifier, zero_shot_priors
+
+ZERO_SHOT_LABELS = [
+    "advice", "bye", "greet", "insult", "joke", "random", "song", "story", "thanks"
+]
+
+TEST_TEXTS = [
+    "what should i do about my exams",
+    "catch you tomorrow",
+    "yo whats up",
+    "you are the worst bot ever",
+    "tell me something that makes me laugh",
+    "the sky is purple on tuesdays",
+    "can you hum something for me",
+    "once upon a time there was a king",
+    "really appreciate it",
+    "any tips for staying calm before an interview",
+    "gotta go now, talk soon",
+    "good evening everyone",
+    "nobody asked for your opinion, moron",
+    "knock knock",
+    "banana keyboard elephant",
+    "play me a tune from the movie",
+    "what happened in the end of that film",
+    "cheers mate, that helped a lot",
+    "i need some guidance on my career",
+    "alright, logging off",
+]
+
+
+def timed(fn, texts):
+    latencies = []
+    labels = []
+    for text in texts:
+        start = time.perf_counter()
+        result = fn(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+        labels.append(result["labels"][0])
+    return labels, latencies
+
+
+def summarize(name, labels, latencies, reference):
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    agreement = sum(a == b for a, b in zip(labels, reference)) / len(reference)
+    print(f"{name:<28}{statistics.mean(latencies):>10.1f}{p95:>10.1f}{agreement:>12.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=3, help="labels kept by the pruned path")
+    parser.add_argument("--model", default="facebook/bart-large-mnli")
+    parser.add_argument("--emotion-model", default="j-hartmann/emotion-english-distilroberta-base",
+                        help="emotion model used for priors ('' for keyword priors only)")
+    args = parser.parse_args()
+
+    print("Loading zero-shot model...")
+    pipe = pipeline("zero-shot-classification", model=args.model)
+    batched = BatchedZeroShotClassifier(pipe)
+    pruned = BatchedZeroShotClassifier(pipe, top_k=args.top_k)
+
+    # The cascade already has the emotion prediction when it reaches zero-shot,
+    # so priors are computed up front and not timed
+    emotion = pipeline("text-classification", model=args.emotion_model) if args.emotion_model else None
+    priors = {text: zero_shot_priors(text, emotion(text)[0] if emotion else None) for text in TEST_TEXTS}
+
+    # Warm up every path once so model load and first-call costs aren't measured
+    pipe(TEST_TEXTS[0], candidate_labels=ZERO_SHOT_LABELS)
+    batched(TEST_TEXTS[0], candidate_labels=ZERO_SHOT_LABELS)
+
+    reference, reference_latencies = timed(lambda t: pipe(t, candidate_labels=ZERO_SHOT_LABELS), TEST_TEXTS)
+    batched_labels, batched_latencies = timed(lambda t: batched(t, candidate_labels=ZERO_SHOT_LABELS), TEST_TEXTS)
+    pruned_labels, pruned_latencies = timed(
+        lambda t: pruned(t, candidate_labels=ZERO_SHOT_LABELS, priors=priors[t]),
+        TEST_TEXTS,
+    )
+
+    print(f"{'path':<28}{'mean ms':>10}{'p95 ms':>10}{'top-1 agree':>12}")
+    summarize("pipeline, all labels", reference, reference_latencies, reference)
+    summarize("batched, all labels", batched_labels, batched_latencies, reference)
+    summarize(f"batched, top-{args.top_k} by prior", pruned_labels, pruned_latencies, reference)
+
+
+if __name__ == "__main__":
+    main()
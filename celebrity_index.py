@@ -0,0 +1,239 @@
+import random
+import zlib
+
+import numpy as np
+
+# Used when the dataset has no usable emotion at all
+DEFAULT_RESPONSE = {
+    "emotion": "greeting",
+    "celebrity": "georgesar",
+    "response": {
+        "image": "",
+        "text": "helloooo",
+        "audio": "https://drive.google.com/uc?export=download&id=1wwRDYJIKtO9QMDuw7lmYD6gHqYjlwBw3"
+    }
+}
+
+
+def dialogue_texts(dataset):
+    """Dialogue text of every entry, in CelebrityIndex row order (embedding matrix rows)"""
+    return [response["text"] for celebrities in dataset.values() for response in celebrities.values()]
+
+
+def response_key(emotion: str, celebrity: str) -> int:
+    """Stable 32-bit id of an (emotion, celebrity) response, across dataset versions"""
+    return zlib.crc32(f"{emotion}\x00{celebrity}".encode("utf-8"))
+
+
+# Resamples before a session-aware pick gives up on avoiding recent responses
+AVOID_TRIES = 4
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(1) weighted sampling with no allocation"""
+
+    def __init__(self, items, weights):
+        n = len(items)
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+        prob = [0.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:
+            prob[i] = 1.0
+        self.items = tuple(items)
+        self.prob = tuple(prob)
+        self.alias = tuple(alias)
+        self.uniform = all(p == 1.0 for p in prob)
+
+    def sample(self, rng=random):
+        i = int(rng.random() * len(self.items))
+        if self.uniform or rng.random() < self.prob[i]:
+            return self.items[i]
+        return self.items[self.alias[i]]
+
+
+class CelebrityIndex:
+    """Immutable index over CELEBRITY_DATASET for response selection.
+
+    Built once per dataset version: a tuple of prebuilt response dicts per
+    emotion, and a fallback chain resolved ahead of time for every known
+    cluster and model label:
+
+        exact dataset emotion -> its cluster (EMOTION_TO_CLUSTER)
+        -> "similar" dataset emotions (substring either way) -> greeting
+
+    Each resolved label owns an alias table, so pick() is O(1) and returns
+    a shared dict. Entries may carry an optional "weight" (default 1).
+    Every entry has a "key" (response_key()) so callers can remember what
+    they served in a few bytes; pick(avoid=...) skips recently served keys.
+    With `fragment`, every entry (and the default) also gets a "fragment"
+    key holding fragment(entry), e.g. its pre-encoded response bytes.
+    Similar-emotion fallbacks keep the old two-step distribution (uniform
+    over emotions, then over their entries). Never mutate returned dicts.
+
+    With `embeddings` (one row per entry, in dialogue_texts() order),
+    pick_ranked() chooses among the entries whose dialogue is most similar
+    to a query vector. Each dataset emotion is a contiguous row range, so
+    scoring a label is one matrix-vector product over a view of the matrix.
+
+    With `base` (the index of the previous dataset, built with the same
+    `fragment`), only the emotions in `changed` are rebuilt; the entries
+    and alias tables of the others are reused as they are.
+    """
+
+    def __init__(self, dataset, known_labels=(), emotion_to_cluster=None, fragment=None, embeddings=None,
+                 base=None, changed=()):
+        self.dataset = dataset
+        self.emotion_to_cluster = dict(emotion_to_cluster or {})
+        self.default = dict(DEFAULT_RESPONSE, key=response_key(DEFAULT_RESPONSE["emotion"], DEFAULT_RESPONSE["celebrity"]))
+        changed = set(changed)
+        reused = set(base.entries) - changed if base is not None else set()
+        self.entries = {}
+        built = []
+        for emotion, celebrities in dataset.items():
+            if emotion in reused:
+                self.entries[emotion] = base.entries[emotion]
+                continue
+            self.entries[emotion] = tuple(
+                {"emotion": emotion, "celebrity": celebrity, "response": response, "key": response_key(emotion, celebrity)}
+                for celebrity, response in celebrities.items()
+            )
+            built.append(emotion)
+        if fragment is not None:
+            self.default["fragment"] = fragment(self.default)
+            for emotion in built:
+                for entry in self.entries[emotion]:
+                    entry["fragment"] = fragment(entry)
+        # Label resolution only depends on which emotions exist, so with the
+        # same emotions a table over unchanged entries is still valid
+        same_emotions = base is not None and set(base.entries) == set(self.entries)
+        self.tables = {}
+        for label in set(known_labels) | set(dataset):
+            emotions = self._resolve_emotions(label)
+            if emotions is None:
+                continue
+            if same_emotions and label in base.tables and not changed.intersection(emotions):
+                self.tables[label] = base.tables[label]
+            else:
+                self.tables[label] = self._table_for(emotions)
+
+        self.embeddings = embeddings
+        self.candidates = {}
+        if embeddings is not None:
+            self.rows = [entry for entries in self.entries.values() for entry in entries]
+            if len(self.rows) != len(embeddings):
+                raise ValueError(f"{len(embeddings)} embedding rows for {len(self.rows)} dataset entries")
+            self.spans = {}
+            start = 0
+            for emotion, entries in self.entries.items():
+                self.spans[emotion] = (start, start + len(entries))
+                start += len(entries)
+            for label in self.tables:
+                self.candidates[label] = self._candidate_rows(self._resolve_emotions(label))
+
+    def _table_for(self, emotions):
+        """Alias table over the entries of one or more dataset emotions"""
+        items, weights = [], []
+        share = 1.0 / len(emotions)
+        for emotion in emotions:
+            entries = self.entries[emotion]
+            entry_weights = [float(e["response"].get("weight", 1.0)) for e in entries]
+            total = sum(entry_weights)
+            for entry, weight in zip(entries, entry_weights):
+                items.append(entry)
+                weights.append(share * weight / total)
+        return AliasTable(items, weights)
+
+    def _resolve_emotions(self, label: str):
+        """Dataset emotions whose entries answer a label, or None"""
+        if self.entries.get(label):
+            return [label]
+        cluster = self.emotion_to_cluster.get(label)
+        if cluster and self.entries.get(cluster):
+            return [cluster]
+        similar = sorted(e for e, entries in self.entries.items() if entries and (label in e or e in label))
+        if similar:
+            return similar
+        if self.entries.get("greeting"):
+            return ["greeting"]
+        return None
+
+    def _resolve(self, label: str):
+        emotions = self._resolve_emotions(label)
+        return self._table_for(emotions) if emotions else None
+
+    def _candidate_rows(self, emotions):
+        """Embedding rows of a label's entries: a slice for one emotion, an index array for several"""
+        if len(emotions) == 1:
+            return slice(*self.spans[emotions[0]])
+        return np.concatenate([np.arange(*self.spans[emotion]) for emotion in emotions])
+
+    @staticmethod
+    def _least_recent(entries, avoid, rng):
+        """An entry not in `avoid` (keys, most recent first), else the one served longest ago"""
+        offset = int(rng.random() * len(entries))
+        best, best_age = None, -1
+        for i in range(len(entries)):
+            entry = entries[(offset + i) % len(entries)]
+            if entry["key"] not in avoid:
+                return entry
+            age = avoid.index(entry["key"])
+            if age > best_age:
+                best, best_age = entry, age
+        return best
+
+    def pick(self, emotion: str, rng=random, avoid=None):
+        """Random {"emotion", "celebrity", "response"} for an emotion label.
+
+        With `avoid` (recently served entry keys, most recent first), up to
+        AVOID_TRIES samples are drawn until one isn't in it; small tables
+        are then scanned for one that isn't, or the one served longest ago.
+        Constant work per pick either way.
+        """
+        table = self.tables.get(emotion)
+        if table is None:
+            # Label unseen at build time: resolve it now (rare, not cached)
+            table = self._resolve(emotion)
+            if table is None:
+                return self.default
+        entry = table.sample(rng)
+        if avoid is None or entry["key"] not in avoid:
+            return entry
+        for _ in range(AVOID_TRIES - 1):
+            entry = table.sample(rng)
+            if entry["key"] not in avoid:
+                return entry
+        if len(table.items) <= 2 * AVOID_TRIES:
+            return self._least_recent(table.items, avoid, rng)
+        return entry
+
+    def pick_ranked(self, emotion: str, query, top_k: int = 5, rng=random, avoid=None):
+        """Random entry among the top_k whose dialogue is most similar to `query`
+        (a normalized vector in the embeddings' space); pick() without embeddings.
+        With `avoid`, the pick prefers top-k entries not served recently."""
+        rows = self.candidates.get(emotion)
+        if rows is None:
+            return self.pick(emotion, rng, avoid)
+        scores = self.embeddings[rows] @ query
+        if top_k < len(scores):
+            best = np.argpartition(scores, -top_k)[-top_k:].tolist()
+        else:
+            best = list(range(len(scores)))
+        if isinstance(rows, slice):
+            entries = [self.rows[rows.start + i] for i in best]
+        else:
+            entries = [self.rows[int(rows[i])] for i in best]
+        if avoid is not None:
+            return self._least_recent(entries, avoid, rng)
+        return entries[int(rng.random() * len(entries))]
+
+    def total_celebrities(self):
+        return sum(len(entries) for entries in self.entries.values())
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Offline bulk classification of chat logs through the celebrity server's cascade.
+
+Streams a JSONL, CSV or TSV file through the same keyword -> emotion model ->
+zero-shot cascade as intelligent_emotion_classifier, without the HTTP
+server. The keyword stage and a bounded result cache run in this process;
+only texts they can't resolve are sent, a chunk at a time, to a pool of
+worker processes that each load the models once and run them in real
+batches. At most a few chunks are in flight, so memory stays flat however
+large the input is.
+
+Results are written in input order (row, optional id, label, stage, rule,
+scores) and a checkpoint next to the output records how far the output is
+complete. Running the same command again after an interruption resumes
+from there; the checkpoint is refused if the keyword rules, labels or
+dataset changed since it was written (--restart starts over).
+
+    python classify_file.py chats.jsonl labels.jsonl
+    python classify_file.py chats.csv labels.csv --text-field message --id-field id --workers 4
+    INFERENCE_BACKEND=stub python classify_file.py chats.jsonl out.jsonl --workers 0
+    python classify_file.py --check              # offline check of the readers and writer
+"""
+
+import argparse
+import csv
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+
+from result_cache import ClassificationCache, normalize_text
+from response_encoding import dumps
+
+SERVER_MODULE = "emotion_server_with_celebrities"
+OUTPUT_FIELDS = ["row", "id", "label", "stage", "rule", "scores"]
+
+# The cascade module, imported once per process
+_server = None
+
+
+def load_server(torch_threads: int = 0):
+    """Import the server module for its cascade; models still load lazily"""
+    global _server
+    if _server is None:
+        # No background reloads or media prefetch: nothing here runs the app's startup hooks,
+        # but keep the module from doing more than it has to
+        os.environ.setdefault("DATASET_WATCH_INTERVAL_S", "0")
+        os.environ.setdefault("MODEL_PRELOAD", "0")
+        if torch_threads > 0:
+            os.environ["TORCH_NUM_THREADS"] = str(torch_threads)
+        _server = importlib.import_module(SERVER_MODULE)
+    return _server
+
+
+def init_worker(torch_threads: int):
+    server = load_server(torch_threads)
+    server.emotion_classifier.get()
+    server.zero_shot_classifier.get()
+
+
+def classify_texts(texts):
+    """Model stages for one chunk, in a worker process"""
+    return _server.classify_batch_uncached(texts)
+
+
+# Delimited formats and their field separators
+DELIMITERS = {"csv": ",", "tsv": "\t"}
+
+
+def input_format(path: str, declared: str = None):
+    """"csv" or "tsv" by extension, otherwise "jsonl" """
+    if declared:
+        return declared
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    return extension if extension in DELIMITERS else "jsonl"
+
+
+def row_text(value) -> str:
+    """A JSON text field as a string: numbers are written out, anything else
+    that isn't a string (null, lists, objects, booleans) counts as no text"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return ""
+
+
+def read_rows(f, fmt: str, text_field: str, id_field: str = None):
+    """(id, text) per input row; rows without text yield an empty string so row numbers stay stable"""
+    if fmt in DELIMITERS:
+        for record in csv.DictReader(f, delimiter=DELIMITERS[fmt]):
+            yield record.get(id_field) if id_field else None, record.get(text_field) or ""
+        return
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if isinstance(record, dict):
+            yield record.get(id_field) if id_field else None, row_text(record.get(text_field))
+        else:
+            yield None, row_text(record)
+
+
+class OutputWriter:
+    """Appends results in JSONL, CSV or TSV (by extension); tell() is the resumable byte offset"""
+
+    def __init__(self, path: str, resume_offset: int = None):
+        self.delimiter = DELIMITERS.get(input_format(path))
+        self.csv = self.delimiter is not None
+        if resume_offset is None:
+            self.f = open(path, "wb")
+            if self.csv:
+                self.f.write(self._csv_line(OUTPUT_FIELDS))
+        else:
+            # Anything past the checkpoint was written after it and is redone
+            self.f = open(path, "r+b")
+            self.f.truncate(resume_offset)
+            self.f.seek(resume_offset)
+
+    def _csv_line(self, values) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, delimiter=self.delimiter).writerow(values)
+        return buffer.getvalue().encode("utf-8")
+
+    def write(self, row: int, row_id, classification):
+        if self.csv:
+            self.f.write(self._csv_line([
+                row, "" if row_id is None else row_id, classification["label"], classification["stage"],
+                classification["rule"] or "", dumps(classification["scores"]).decode("utf-8"),
+            ]))
+        else:
+            self.f.write(dumps({
+                "row": row, "id": row_id, "label": classification["label"], "stage": classification["stage"],
+                "rule": classification["rule"], "scores": classification["scores"],
+            }) + b"\n")
+
+    def flush(self) -> int:
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+
+def checkpoint_path(output: str) -> str:
+    return output + ".checkpoint.json"
+
+
+def load_checkpoint(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, state):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+class Progress:
+    """Rows, throughput and input position on stderr, at most every `interval` seconds"""
+
+    def __init__(self, total_bytes: int, interval: float = 2.0, start_rows: int = 0):
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.start_rows = start_rows
+        self.start = time.monotonic()
+        self.last = 0.0
+        self.line_end = "\r" if sys.stderr.isatty() else "\n"
+
+    def update(self, rows: int, position: int, stages: Counter, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.last < self.interval:
+            return
+        self.last = now
+        elapsed = max(now - self.start, 1e-9)
+        rate = (rows - self.start_rows) / elapsed
+        done = position / self.total_bytes if self.total_bytes else 1.0
+        classified = sum(stages.values()) or 1
+        keyword = (stages["keyword"] + stages["cache"]) / classified
+        eta = elapsed / done * (1 - done) if 0 < done < 1 else 0.0
+        sys.stderr.write(
+            f"{rows:>10,} rows  {rate:>8,.0f} rows/s  {done:6.1%} of input  "
+            f"{keyword:6.1%} keyword/cache  eta {eta:,.0f}s{self.line_end}"
+        )
+        sys.stderr.flush()
+
+
+class Chunk:
+    """One chunk of input rows; rows the keyword stage or the cache left open go to the pool"""
+
+    def __init__(self, rows):
+        self.rows = rows  # [(row, id, text)]
+        self.classifications = [None] * len(rows)
+        self.sources = [None] * len(rows)
+        self.misses = {}  # normalized text -> row indexes
+        self.miss_texts = []
+        self.future = None
+
+
+def run(args):
+    server = load_server(args.torch_threads)
+    version = server.classification_version()
+    fmt = input_format(args.input, args.format)
+    checkpoint_file = checkpoint_path(args.output)
+
+    checkpoint = None if args.restart else load_checkpoint(checkpoint_file)
+    if checkpoint is not None:
+        if checkpoint["input"] != os.path.abspath(args.input):
+            raise SystemExit(f"{checkpoint_file} belongs to {checkpoint['input']}; use --restart")
+        if checkpoint["version"] != version:
+            raise SystemExit("Keyword rules, labels or dataset changed since the checkpoint; use --restart")
+    rows_done = checkpoint["rows"] if checkpoint else 0
+    stages = Counter(checkpoint["stages"]) if checkpoint else Counter()
+
+    cache = ClassificationCache(max_entries=args.cache_entries)
+    writer = OutputWriter(args.output, checkpoint["output_bytes"] if checkpoint else None)
+    if checkpoint:
+        print(f"Resuming after row {rows_done:,}", file=sys.stderr)
+
+    executor = None
+    if args.workers > 0:
+        executor = ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=get_context("spawn"),
+            initializer=init_worker,
+            initargs=(args.torch_threads,),
+        )
+    else:
+        init_worker(args.torch_threads)
+
+    def submit(texts):
+        if executor is not None:
+            return executor.submit(classify_texts, texts)
+        future = Future()
+        future.set_result(classify_texts(texts))
+        return future
+
+    f = open(args.input, newline="", encoding="utf-8")
+    progress = Progress(os.fstat(f.fileno()).st_size, args.progress_interval, rows_done)
+    row_iter = read_rows(f, fmt, args.text_field, args.id_field)
+    for _ in range(rows_done):
+        next(row_iter, None)
+
+    def start_chunk(rows):
+        """Keyword stage and cache lookups here; the rest to the pool"""
+        chunk = Chunk(rows)
+        for index, (_, _, text) in enumerate(rows):
+            classification = server.keyword_classification(text)
+            if classification is not None:
+                chunk.classifications[index] = classification
+                chunk.sources[index] = "keyword"
+                continue
+            key = normalize_text(text)
+            classification = cache.get(key)
+            if classification is not None:
+                chunk.classifications[index] = classification
+                chunk.sources[index] = "cache"
+                continue
+            if key not in chunk.misses:
+                chunk.misses[key] = []
+                chunk.miss_texts.append(text)
+            chunk.misses[key].append(index)
+        if chunk.miss_texts:
+            chunk.future = submit(chunk.miss_texts)
+        return chunk
+
+    def finish_chunk(chunk):
+        nonlocal rows_done
+        if chunk.future is not None:
+            for (key, indexes), classification in zip(chunk.misses.items(), chunk.future.result()):
+                if classification["stage"] != "default":
+                    cache.put(key, classification)
+                for index in indexes:
+                    chunk.classifications[index] = classification
+                    chunk.sources[index] = classification["stage"]
+        for (row, row_id, _), classification in zip(chunk.rows, chunk.classifications):
+            writer.write(row, row_id, classification)
+        stages.update(chunk.sources)
+        rows_done += len(chunk.rows)
+        save_checkpoint(checkpoint_file, {
+            "input": os.path.abspath(args.input),
+            "version": version,
+            "rows": rows_done,
+            "output_bytes": writer.flush(),
+            "stages": dict(stages),
+        })
+        progress.update(rows_done, f.buffer.tell(), stages)
+
+    # A bounded window of chunks in flight; results are written strictly in order
+    in_flight = deque()
+    window = max(1, args.workers) * 2
+    start = time.monotonic()
+    try:
+        row_number = rows_done
+        rows = []
+        for row_id, text in row_iter:
+            rows.append((row_number, row_id, text))
+            row_number += 1
+            if len(rows) == args.chunk_size:
+                in_flight.append(start_chunk(rows))
+                rows = []
+                while in_flight and (len(in_flight) > window or in_flight[0].future is None or in_flight[0].future.done()):
+                    finish_chunk(in_flight.popleft())
+        if rows:
+            in_flight.append(start_chunk(rows))
+        while in_flight:
+            finish_chunk(in_flight.popleft())
+    finally:
+        f.close()
+        writer.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    progress.update(rows_done, progress.total_bytes, stages, force=True)
+    if progress.line_end == "\r":
+        sys.stderr.write("\n")
+    elapsed = time.monotonic() - start
+    return {
+        "rows": rows_done,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round((rows_done - progress.start_rows) / elapsed, 1) if elapsed else 0.0,
+        "stages": dict(stages),
+        "cache": cache.stats(),
+        "output": args.output,
+    }
+
+
+def check():
+    """Offline check of input_format/read_rows and OutputWriter round trips"""
+    rows = [("a1", "hello, there"), ("a2", 'she said "hi"\tthen left')]
+    for fmt in DELIMITERS:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=DELIMITERS[fmt])
+        writer.writerow(["id", "text"])
+        writer.writerows(rows)
+        buffer.seek(0)
+        assert input_format(f"chats.{fmt.upper()}") == fmt
+        assert list(read_rows(buffer, fmt, "text", "id")) == rows, fmt
+
+    jsonl = io.StringIO("\n".join([
+        '{"id": 1, "text": "fine"}', '{"id": 2, "text": 42}', '{"id": 3, "text": ["a", "b"]}',
+        '{"id": 4, "text": null}', '{"id": 5}', '{"id": 6, "text": {"nested": 1}}', '"plain"', '7', '[1]',
+    ]))
+    assert list(read_rows(jsonl, "jsonl", "text", "id")) == [
+        (1, "fine"), (2, "42"), (3, ""), (4, ""), (5, ""), (6, ""), (None, "plain"), (None, "7"), (None, ""),
+    ]
+
+    classification = {"label": "happy", "stage": "keyword", "rule": "happy", "scores": {"happy": 1.0}}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, first in (("out.tsv", "row\tid\t"), ("out.csv", "row,id,"), ("out.jsonl", '{"row":0')):
+            path = os.path.join(directory, name)
+            writer = OutputWriter(path)
+            writer.write(0, "a1", classification)
+            writer.close()
+            with open(path, encoding="utf-8") as f:
+                assert f.read().startswith(first), name
+    print("ok: csv/tsv/jsonl readers and writers, non-string JSON text coerced")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", help="JSONL (one object or string per line), CSV or TSV file")
+    parser.add_argument("output", nargs="?", help="results file; .csv writes CSV, .tsv TSV, anything else JSONL")
+    parser.add_argument("--format", choices=["jsonl", *DELIMITERS], help="input format (default: from the extension)")
+    parser.add_argument("--text-field", default="text", help="field or column holding the message")
+    parser.add_argument("--id-field", help="field or column copied to the output as id")
+    parser.add_argument("--workers", type=int, default=2, help="model worker processes (0 = run models in this process)")
+    parser.add_argument("--torch-threads", type=int, default=0, help="torch threads per worker (0 = torch default)")
+    parser.add_argument("--chunk-size", type=int, default=512, help="rows per chunk sent to a worker")
+    parser.add_argument("--cache-entries", type=int, default=100000, help="classifications cached by normalized text")
+    parser.add_argument("--progress-interval", type=float, default=2.0, help="seconds between progress lines")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    parser.add_argument("--check", action="store_true", help="check the file readers and writer offline and exit")
+    args = parser.parse_args()
+    if args.check:
+        check()
+        return
+    if args.output is None:
+        parser.error("input and output are required")
+
+    print(json.dumps(run(args)))
+    os.remove(checkpoint_path(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+
+# Versioned JSON-lines file holding the celebrity dataset. The first line is
+# a header ({"schema_version": 1}); every other line is one record:
+# {"emotion", "character", "image", "text", "audio"[, "weight"]}
+SCHEMA_VERSION = 1
+DATASET_PATH = os.environ.get(
+    "CELEBRITY_DATASET_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "celebrity_dataset.jsonl"),
+)
+
+RECORD_FIELDS = ("image", "text", "audio")
+
+
+def records_to_dataset(records):
+    """{emotion: {character: {"image", "text", "audio"}}} from flat records"""
+    dataset = {}
+    for record in records:
+        response = {field: record.get(field, "") for field in RECORD_FIELDS}
+        if "weight" in record:
+            response["weight"] = record["weight"]
+        dataset.setdefault(record["emotion"], {})[record["character"]] = response
+    return dataset
+
+
+def dataset_to_records(dataset):
+    for emotion, characters in dataset.items():
+        for character, response in characters.items():
+            record = {"emotion": emotion, "character": character}
+            record.update({field: response.get(field, "") for field in RECORD_FIELDS})
+            if "weight" in response:
+                record["weight"] = response["weight"]
+            yield record
+
+
+def load_dataset(path: str = DATASET_PATH):
+    """Read the dataset file through a read-only memory map.
+
+    Returns (dataset, info) where info carries the schema version, a
+    checksum of the file contents, the record count and the file's mtime.
+    """
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        if stat.st_size == 0:
+            raise ValueError(f"Dataset file {path} is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            checksum = hashlib.sha256(mm).hexdigest()[:16]
+            header = json.loads(mm.readline())
+            if header.get("schema_version") != SCHEMA_VERSION:
+                raise ValueError(f"Unsupported dataset schema {header.get('schema_version')!r} in {path}")
+            records = [json.loads(line) for line in iter(mm.readline, b"") if line.strip()]
+
+    info = {
+        "path": path,
+        "schema_version": SCHEMA_VERSION,
+        "checksum": checksum,
+        "records": len(records),
+        "mtime": stat.st_mtime,
+    }
+    return records_to_dataset(records), info
+
+
+def write_dataset(dataset, path: str = DATASET_PATH):
+    """Write the dataset atomically (temp file + rename), so a watching
+    server never sees a half-written file; returns the info load_dataset()
+    would report for it"""
+    lines = [json.dumps({"schema_version": SCHEMA_VERSION}) + "\n"]
+    lines.extend(json.dumps(record, ensure_ascii=False) + "\n" for record in dataset_to_records(dataset))
+    content = "".join(lines).encode("utf-8")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return {
+        "path": path,
+        "schema_version": SCHEMA_VERSION,
+        "checksum": hashlib.sha256(content).hexdigest()[:16],
+        "records": len(lines) - 1,
+        "mtime": os.stat(path).st_mtime,
+    }
+
+
+class DatasetWatcher:
+    """Polls the dataset file and calls on_change(dataset, info) when it changes.
+
+    A file that fails to load is reported and skipped; the server keeps
+    serving the last good dataset. check() is serialized, so reloads
+    triggered from several threads swap datasets in file order and an
+    older load can never replace a newer one.
+    """
+
+    def __init__(self, path: str, on_change, interval: float = 2.0):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self._signature = self._stat_signature()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def check(self):
+        """Reload if the file changed since the last check; True if swapped"""
+        with self._lock:
+            signature = self._stat_signature()
+            if signature is None or signature == self._signature:
+                return False
+            self._signature = signature
+            try:
+                dataset, info = load_dataset(self.path)
+            except Exception as e:
+                print(f"Dataset reload failed, keeping the current dataset: {e}")
+                return False
+            self.on_change(dataset, info)
+            print(f"🔄 Reloaded dataset {info['checksum']} ({info['records']} records)")
+            return True
+
+    def swap(self, dataset, info, on_change=None):
+        """Swap in a dataset that was just written to the file by this process
+        (on_change, default the watcher's), without reading it back; the
+        next check() then treats the file as current"""
+        with self._lock:
+            (on_change or self.on_change)(dataset, info)
+            self._signature = self._stat_signature()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="dataset-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Incremental sync of the celebrity dataset from the Google Sheet CSV export.
+
+Each sync sends a conditional GET (If-None-Match / If-Modified-Since from
+the previous response). A 304, or a body whose hash matches the last one
+(Google's export doesn't always send validators), ends the sync without
+parsing anything. Otherwise the sheet rows are diffed against the dataset
+file record by record and only added, removed or changed records are
+applied, so fields the sheet doesn't have (e.g. "weight") survive. The
+file is written atomically and a running server's watcher swaps it in.
+
+A body that doesn't look like the sheet (missing columns, e.g. an HTML
+error page or renamed headers), parses to no records, or would remove more
+than --max-removed-share of the dataset is rejected: nothing is written and
+the validators are not saved, so the next sync fetches it again.
+
+    python dataset_sync.py                       # one sync
+    python dataset_sync.py --interval 300        # keep syncing
+    python dataset_sync.py --url http://127.0.0.1:9000/sheet.csv --dry-run
+    python dataset_sync.py --check               # offline check of parse + diff
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from io import StringIO
+
+from dataset_store import DATASET_PATH, RECORD_FIELDS, load_dataset, write_dataset
+
+SHEET_ID = "1bQKZKzPlDx0LvmT7P8BJFiN989f9Pe1GUfOot6xJW5o"
+SHEET_GID = "1289986606"
+SHEET_CSV_URL = os.environ.get(
+    "DATASET_SOURCE_URL",
+    f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/export?format=csv&gid={SHEET_GID}",
+)
+
+# Sheet column -> dataset field
+SHEET_COLUMNS = {"image": "image", "dialogue": "text", "audio": "audio"}
+
+# Columns a usable export has: the record key and every dataset field
+REQUIRED_COLUMNS = ("emotion", "character") + tuple(
+    column for column, field in SHEET_COLUMNS.items() if field in RECORD_FIELDS
+)
+
+# Largest share of the dataset one sync may remove before it is refused
+MAX_REMOVED_SHARE = float(os.environ.get("DATASET_SYNC_MAX_REMOVED_SHARE", "0.5"))
+
+
+class SheetRejected(ValueError):
+    """The fetched sheet is not safe to apply to the dataset"""
+
+
+def placeholder_image(character: str) -> str:
+    """Avatar URL for a sheet row without an image, as the dataset has always used"""
+    return (
+        f"https://ui-avatars.com/api/?name={character.replace('_', '+')}"
+        "&background=random&color=fff&size=128&rounded=true&bold=true"
+    )
+
+
+def parse_sheet_csv(text: str):
+    """{emotion: {character: {"image", "text", "audio"}}} from the sheet CSV;
+    SheetRejected if the header lacks a REQUIRED_COLUMNS column. Empty image
+    cells get placeholder_image(), so they diff equal to the dataset."""
+    dataset = {}
+    reader = csv.DictReader(StringIO(text))
+    columns = {(name or "").strip() for name in reader.fieldnames or ()}
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise SheetRejected(f"sheet is missing columns {missing}")
+    for row in reader:
+        character = (row.get("character") or "").strip()
+        emotion = (row.get("emotion") or "").strip()
+        # Skip empty rows
+        if not character or not emotion:
+            continue
+        response = {field: (row.get(column) or "").strip() for column, field in SHEET_COLUMNS.items()}
+        if not response["image"]:
+            response["image"] = placeholder_image(character)
+        dataset.setdefault(emotion, {})[character] = response
+    return dataset
+
+
+def fetch_sheet(url: str = SHEET_CSV_URL, etag=None, last_modified=None,
+                timeout: float = 10.0, retries: int = 3, backoff: float = 1.0):
+    """Conditional GET with timeout and retries on network errors and 5xx.
+
+    Returns (status, body, headers); body is None for 304 Not Modified.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    for attempt in range(retries + 1):
+        try:
+            request = urllib.request.Request(url, headers=headers)
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.status, response.read().decode("utf-8"), dict(response.headers)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return 304, None, dict(e.headers)
+            if e.code < 500 or attempt == retries:
+                raise
+        except (urllib.error.URLError, TimeoutError, ConnectionError):
+            if attempt == retries:
+                raise
+        time.sleep(backoff * 2 ** attempt)
+
+
+def diff_datasets(old, new):
+    """Record-level diff keyed by (emotion, character), comparing sheet fields only"""
+    old_keys = {(e, c) for e, chars in old.items() for c in chars}
+    new_keys = {(e, c) for e, chars in new.items() for c in chars}
+    changed = sorted(
+        key for key in old_keys & new_keys
+        if any(old[key[0]][key[1]].get(f, "") != new[key[0]][key[1]].get(f, "") for f in RECORD_FIELDS)
+    )
+    return {
+        "added": sorted(new_keys - old_keys),
+        "removed": sorted(old_keys - new_keys),
+        "changed": changed,
+    }
+
+
+def apply_diff(dataset, new, diff):
+    """Copy of `dataset` with the diff applied; untouched records are shared as-is"""
+    result = {emotion: dict(chars) for emotion, chars in dataset.items()}
+    for emotion, character in diff["removed"]:
+        del result[emotion][character]
+        if not result[emotion]:
+            del result[emotion]
+    for emotion, character in diff["added"]:
+        result.setdefault(emotion, {})[character] = dict(new[emotion][character])
+    for emotion, character in diff["changed"]:
+        # Keep fields the sheet doesn't carry (e.g. "weight")
+        response = dict(result[emotion][character])
+        response.update({f: new[emotion][character].get(f, "") for f in RECORD_FIELDS})
+        result[emotion][character] = response
+    return result
+
+
+def diff_summary(diff):
+    return {kind: len(keys) for kind, keys in diff.items()}
+
+
+def check_sheet(current, new, diff, max_removed_share: float = MAX_REMOVED_SHARE):
+    """Raise SheetRejected for a parse that would empty or gut the dataset"""
+    if not new:
+        raise SheetRejected("sheet has no records")
+    total = sum(len(characters) for characters in current.values())
+    if total and len(diff["removed"]) > max_removed_share * total:
+        raise SheetRejected(
+            f"sheet would remove {len(diff['removed'])} of {total} records (limit {max_removed_share:.0%})"
+        )
+
+
+class DatasetSync:
+    """Conditional, incremental sync of the sheet into the dataset file.
+
+    Validators and the last body hash are kept in `<path>.sync.json` so a
+    restarted sync still sends conditional requests. `on_update(dataset,
+    info, diff)` is called after a changed dataset was written, with the
+    file info load_dataset() would report, so a server can apply the diff
+    without reading the file back.
+    """
+
+    def __init__(self, url: str = SHEET_CSV_URL, path: str = DATASET_PATH, on_update=None,
+                 timeout: float = 10.0, retries: int = 3, backoff: float = 1.0,
+                 max_removed_share: float = MAX_REMOVED_SHARE):
+        self.url = url
+        self.path = path
+        self.on_update = on_update
+        self.max_removed_share = max_removed_share
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.state_path = f"{path}.sync.json"
+        self.state = self._load_state()
+        self.last_result = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def sync(self, dry_run: bool = False):
+        """One sync; returns {"status": "not_modified" | "unchanged" | "updated" | "rejected", ...}"""
+        with self._lock:
+            start = time.perf_counter()
+            status, body, headers = fetch_sheet(
+                self.url, self.state.get("etag"), self.state.get("last_modified"),
+                self.timeout, self.retries, self.backoff,
+            )
+            if status == 304:
+                result = {"status": "not_modified"}
+            else:
+                content_hash = hashlib.sha256(body.encode("utf-8")).hexdigest()
+                validators = {
+                    "etag": headers.get("ETag"),
+                    "last_modified": headers.get("Last-Modified"),
+                    "content_hash": content_hash,
+                }
+                if content_hash == self.state.get("content_hash"):
+                    result = {"status": "unchanged"}
+                else:
+                    current, _ = load_dataset(self.path)
+                    try:
+                        new = parse_sheet_csv(body)
+                        diff = diff_datasets(current, new)
+                        check_sheet(current, new, diff, self.max_removed_share)
+                    except SheetRejected as e:
+                        result = {"status": "rejected", "reason": str(e)}
+                    else:
+                        result = {"status": "updated", "diff": diff_summary(diff)}
+                        if not any(diff.values()):
+                            result["status"] = "unchanged"
+                        elif not dry_run:
+                            dataset = apply_diff(current, new, diff)
+                            info = write_dataset(dataset, self.path)
+                            if self.on_update:
+                                self.on_update(dataset, info, diff)
+                # A rejected sheet keeps the old validators, so the next sync fetches it again
+                if not dry_run and result["status"] != "rejected":
+                    self.state = validators
+                    self._save_state()
+            result["elapsed_ms"] = (time.perf_counter() - start) * 1000.0
+            self.last_result = result
+            return result
+
+    def _run(self, interval: float):
+        while True:
+            try:
+                result = self.sync()
+                if result["status"] == "updated":
+                    print(f"🔄 Dataset synced: {result['diff']}")
+                elif result["status"] == "rejected":
+                    print(f"Dataset sync rejected, keeping the current dataset: {result['reason']}")
+            except Exception as e:
+                print(f"Dataset sync failed, keeping the current dataset: {e}")
+            if self._stop.wait(interval):
+                return
+
+    def start(self, interval: float):
+        """Sync now and then every `interval` seconds in a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="dataset-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def sheet_csv(dataset, blank_images: bool = False):
+    """The sheet CSV export a dataset would come from"""
+    out = StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["emotion", "character", *SHEET_COLUMNS])
+    for emotion, characters in dataset.items():
+        for character, response in characters.items():
+            image = "" if blank_images else response.get("image", "")
+            writer.writerow([emotion, character, image, response.get("text", ""), response.get("audio", "")])
+    return out.getvalue()
+
+
+def check(path: str = DATASET_PATH):
+    """Offline check of parse_sheet_csv/diff_datasets/apply_diff against the dataset file"""
+    current, _ = load_dataset(path)
+    for blank_images in (False, True):
+        new = parse_sheet_csv(sheet_csv(current, blank_images))
+        diff = diff_datasets(current, new)
+        assert not any(diff.values()), f"blank_images={blank_images}: {diff_summary(diff)}"
+
+    # One edited dialogue and one explicit image change only those records
+    emotion, characters = next(iter(current.items()))
+    first, second = list(characters)[:2]
+    edited = {e: {c: dict(r) for c, r in chars.items()} for e, chars in current.items()}
+    edited[emotion][first]["text"] += " (edited)"
+    edited[emotion][second]["image"] = "https://example.com/new.png"
+    new = parse_sheet_csv(sheet_csv(edited))
+    diff = diff_datasets(current, new)
+    assert diff == {"added": [], "removed": [], "changed": sorted([(emotion, first), (emotion, second)])}, diff
+    check_sheet(current, new, diff)
+    assert apply_diff(current, new, diff) == edited
+    print(f"ok: {sum(map(len, current.values()))} records round-trip, blank image cells keep their placeholders")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=SHEET_CSV_URL, help="CSV export URL (default: $DATASET_SOURCE_URL or the sheet)")
+    parser.add_argument("--path", default=DATASET_PATH, help="dataset file to update")
+    parser.add_argument("--interval", type=float, default=0, help="keep syncing every N seconds")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--max-removed-share", type=float, default=MAX_REMOVED_SHARE,
+                        help="refuse a sheet that would remove more than this share of the records")
+    parser.add_argument("--dry-run", action="store_true", help="report the diff without writing anything")
+    parser.add_argument("--check", action="store_true", help="check parsing and diffing offline against --path and exit")
+    args = parser.parse_args()
+    if args.check:
+        check(args.path)
+        return
+
+    sync = DatasetSync(args.url, args.path, timeout=args.timeout, retries=args.retries,
+                       max_removed_share=args.max_removed_share)
+    while True:
+        result = sync.sync(dry_run=args.dry_run)
+        print(json.dumps(result))
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
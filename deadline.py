@@ -0,0 +1,61 @@
+import math
+import threading
+import time
+
+
+class StageCostEstimator:
+    """Running estimate of how long each cascade stage takes.
+
+    An exponentially weighted moving average per stage, so the estimate
+    follows load (queueing in the batcher and the inference pool shows up
+    as a higher cost) without keeping a window of samples.
+    """
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.costs = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            previous = self.costs.get(stage)
+            self.costs[stage] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+
+    def estimate(self, stage: str) -> float:
+        """Expected cost in seconds; 0 until the stage has run once"""
+        return self.costs.get(stage, 0.0)
+
+    def stats(self):
+        with self._lock:
+            return {stage: round(cost * 1000.0, 3) for stage, cost in self.costs.items()}
+
+
+class Deadline:
+    """Latency budget of one request, started when the request arrived.
+
+    A budget of 0 means no deadline: every stage is allowed and waits
+    have no timeout.
+    """
+
+    def __init__(self, budget_ms: float, costs: StageCostEstimator):
+        self.budget_ms = budget_ms
+        self.costs = costs
+        self.expires = time.monotonic() + budget_ms / 1000.0 if budget_ms > 0 else None
+
+    @property
+    def unlimited(self):
+        return self.expires is None
+
+    def remaining(self) -> float:
+        """Seconds left (inf without a budget, never negative)"""
+        if self.expires is None:
+            return math.inf
+        return max(0.0, self.expires - time.monotonic())
+
+    def timeout(self):
+        """remaining() as a timeout argument: None without a budget"""
+        return None if self.expires is None else self.remaining()
+
+    def allows(self, stage: str) -> bool:
+        """Whether the remaining budget covers the stage's observed cost"""
+        return self.expires is None or self.costs.estimate(stage) < self.remaining()
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from file_lock import file_lock
+from ngram_classifier import ngram_hashes
+
+DIALOGUE_EMBEDDINGS_DIR = os.environ.get(
+    "DIALOGUE_EMBEDDINGS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dialogue_embeddings")
+)
+DEFAULT_EMBEDDER = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class HashingEmbedder:
+    """Local stand-in for a sentence encoder: hashed n-gram counts, L2-normalized.
+
+    No model download and deterministic, so ranking runs with
+    INFERENCE_BACKEND=stub and in `benchmark_dialogue_ranking.py --check`;
+    similarity is purely lexical.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.name = f"hashing-{dim}"
+        self.dim = dim
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = np.bincount(ngram_hashes(text, self.dim), minlength=self.dim)
+        return _normalize_rows(matrix)
+
+
+class TransformerEmbedder:
+    """Mean-pooled, L2-normalized sentence embeddings from a transformers encoder.
+
+    embed() is serialized: queries are embedded from several inference
+    threads, and a fast tokenizer raises "Already borrowed" when two
+    threads change its padding/truncation settings at once.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDER, max_length: int = 128):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self.name = model_name
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).eval()
+        self.max_length = max_length
+        self.dim = self.model.config.hidden_size
+        self._lock = threading.Lock()
+
+    def embed(self, texts):
+        with self._lock:
+            return self._embed(texts)
+
+    def _embed(self, texts):
+        inputs = self.tokenizer(list(texts), padding=True, truncation=True, max_length=self.max_length, return_tensors="pt")
+        with self.torch.inference_mode():
+            hidden = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1.0)
+        return _normalize_rows(pooled.numpy())
+
+
+def load_embedder(name: str = DEFAULT_EMBEDDER):
+    """"hashing" (or "hashing-<dim>") for the local stub, anything else is a transformers model"""
+    if name.startswith("hashing"):
+        dim = name.partition("-")[2]
+        return HashingEmbedder(int(dim)) if dim else HashingEmbedder()
+    return TransformerEmbedder(name)
+
+
+class EmbeddingStore:
+    """Dialogue embedding matrices persisted per embedder and memory-mapped.
+
+    `<dir>/<embedder>.npy` holds one float32 row per dialogue line and
+    `<embedder>.json` the hash of each row's text. A restart with the same
+    lines maps the file and embeds nothing; after a dataset change only
+    lines whose text is new are embedded, the other rows are copied over.
+    Pre-forked workers embed under a file lock, so one of them does the
+    work and the others map its file.
+    """
+
+    def __init__(self, directory: str = DIALOGUE_EMBEDDINGS_DIR, batch_size: int = 64):
+        self.directory = directory
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+
+    def _paths(self, embedder_name: str):
+        slug = re.sub(r"[^\w.-]+", "_", embedder_name)
+        base = os.path.join(self.directory, slug)
+        return base + ".npy", base + ".json"
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+    def _load(self, matrix_path: str, keys_path: str):
+        """(keys, read-only memmap) or (None, None) when missing or inconsistent"""
+        try:
+            with open(keys_path) as f:
+                keys = json.load(f)["keys"]
+            matrix = np.load(matrix_path, mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return None, None
+        if matrix.ndim != 2 or matrix.shape[0] != len(keys) or matrix.dtype != np.float32:
+            return None, None
+        return keys, matrix
+
+    def matrix(self, texts, embedder):
+        """(len(texts), dim) float32 embeddings in text order, memory-mapped from disk"""
+        texts = list(texts)
+        keys = [self._key(text) for text in texts]
+        matrix_path, keys_path = self._paths(embedder.name)
+        with self._lock, file_lock(matrix_path + ".lock"):
+            old_keys, old_matrix = self._load(matrix_path, keys_path)
+            if old_keys == keys:
+                return old_matrix
+
+            rows = {key: i for i, key in enumerate(old_keys or ())}
+            if old_matrix is not None and old_matrix.shape[1] != embedder.dim:
+                rows = {}
+            matrix = np.empty((len(texts), embedder.dim), dtype=np.float32)
+            missing = []
+            for i, key in enumerate(keys):
+                if key in rows:
+                    matrix[i] = old_matrix[rows[key]]
+                else:
+                    missing.append(i)
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start:start + self.batch_size]
+                matrix[batch] = embedder.embed([texts[i] for i in batch])
+
+            # Matrix first, then the keys that validate it; a crash in between
+            # leaves a mismatch that the next load treats as missing
+            os.makedirs(self.directory, exist_ok=True)
+            with open(matrix_path + ".tmp", "wb") as f:
+                np.save(f, matrix)
+            os.replace(matrix_path + ".tmp", matrix_path)
+            with open(keys_path + ".tmp", "w") as f:
+                json.dump({"embedder": embedder.name, "dim": embedder.dim, "keys": keys}, f)
+            os.replace(keys_path + ".tmp", keys_path)
+            print(f"Embedded {len(missing)} of {len(texts)} dialogue lines with {embedder.name}")
+            return np.load(matrix_path, mmap_mode="r")
@@ -3,8 +3,13 @@
 
 from fastapi import FastAPI, Request
 from pydantic import BaseModel
-from transformers import pipeline
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from inference_executor import InferenceExecutor, InferenceOverloaded, set_torch_threads
+from inference_scheduler import MicroBatchScheduler
+from zero_shot import BatchedZeroShotClassifier, zero_shot_priors
+from model_loading import WARMUP_TEXTS, LazyModel, StartupTracker, load_pipeline
+import os
 
 # Start FastAPI app
 app = FastAPI()
@@ -18,11 +23,63 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Inference executor settings
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "16"))
+INFERENCE_MAX_PENDING = int(os.environ.get("INFERENCE_MAX_PENDING", "64"))
+INFERENCE_RETRY_AFTER_S = int(os.environ.get("INFERENCE_RETRY_AFTER_S", "1"))
+TORCH_NUM_THREADS = int(os.environ.get("TORCH_NUM_THREADS", "0"))
+
+# Blocking model calls run on a dedicated, bounded thread pool
+set_torch_threads(TORCH_NUM_THREADS)
+inference_executor = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_MAX_PENDING, INFERENCE_RETRY_AFTER_S)
+
+# Micro-batching settings for the emotion model
+EMOTION_BATCH_MAX_SIZE = int(os.environ.get("EMOTION_BATCH_MAX_SIZE", "16"))
+EMOTION_BATCH_MAX_WAIT_MS = float(os.environ.get("EMOTION_BATCH_MAX_WAIT_MS", "5"))
+
+# Inputs longer than this many tokens keep their head and tail (0 = model limit);
+# batches are split by token length at these edges to limit padding
+EMOTION_MAX_TOKENS = int(os.environ.get("EMOTION_MAX_TOKENS", "256"))
+ZERO_SHOT_MAX_TOKENS = int(os.environ.get("ZERO_SHOT_MAX_TOKENS", "256"))
+TOKEN_BUCKET_EDGES = [int(edge) for edge in os.environ.get("TOKEN_BUCKET_EDGES", "16,32,64,128").split(",") if edge.strip()]
+
+# Load and warm the models in the background at server startup (0 = load on first use only)
+MODEL_PRELOAD = os.environ.get("MODEL_PRELOAD", "1") != "0"
+
+# Inference backend: "torch" (default) or "onnx" (ONNX Runtime, PyTorch as fallback)
+BACKEND_OPTIONS = {
+    "backend": os.environ.get("INFERENCE_BACKEND", "torch"),
+    "quantize": os.environ.get("ONNX_QUANTIZE", "0") == "1",
+    "num_threads": TORCH_NUM_THREADS,
+}
+
+# Startup phase timings and readiness for /readyz
+startup = StartupTracker(require_warmup=MODEL_PRELOAD)
+
 # Initialize Pre-trained Emotion Classifier (FREE model)
-emotion_classifier = pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base")
+# Concurrent single-text calls are gathered into batched forward passes
+emotion_classifier = LazyModel("emotion_model", lambda: MicroBatchScheduler(
+    load_pipeline("text-classification", "j-hartmann/emotion-english-distilroberta-base", **BACKEND_OPTIONS),
+    max_batch_size=EMOTION_BATCH_MAX_SIZE,
+    max_wait_ms=EMOTION_BATCH_MAX_WAIT_MS,
+    max_tokens=EMOTION_MAX_TOKENS,
+    bucket_edges=TOKEN_BUCKET_EDGES,
+), startup)
+
+# Zero-shot pruning: score only the top-k labels by prior (0 = all labels)
+ZERO_SHOT_TOP_K = int(os.environ.get("ZERO_SHOT_TOP_K", "0"))
 
 # Initialize Zero-Shot Classifier for non-emotion intents
-zero_shot_classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+# All hypotheses for a text are scored in one batched NLI pass
+zero_shot_classifier = LazyModel("zero_shot_model", lambda: BatchedZeroShotClassifier(
+    load_pipeline("zero-shot-classification", "facebook/bart-large-mnli", **BACKEND_OPTIONS),
+    top_k=ZERO_SHOT_TOP_K,
+    max_tokens=ZERO_SHOT_MAX_TOKENS,
+    bucket_edges=TOKEN_BUCKET_EDGES,
+), startup)
+
+# Keyword rules compiled into a single-pass matcher
+from keyword_rules import HYBRID_KEYWORD_MATCHER
 
 # Define candidate labels for zero-shot
 ZERO_SHOT_LABELS = [
@@ -46,31 +103,17 @@ class UserInput(BaseModel):
 
 # Hybrid Classifier
 def hybrid_classifier(text: str):
-    text_lower = text.lower()
-
-    # Keyword-based fallback for low-resource labels
-    if any(word in text_lower for word in ["hello", "hi", "hey", "morning", "good morning"]):
-        return "greet"
-    if any(word in text_lower for word in ["bye", "goodbye", "see you", "later", "goodbye"]):
-        return "bye"
-    if any(word in text_lower for word in ["sing", "song", "music", "tune", "melody"]):
-        return "song"
-    if any(word in text_lower for word in ["thank", "thanks", "thank you"]):
-        return "thanks"
-    if any(word in text_lower for word in ["joke", "funny", "humor", "laugh"]):
-        return "joke"
-    if any(word in text_lower for word in ["story", "tale", "narrative"]):
-        return "story"
-    if any(word in text_lower for word in ["advice", "help", "suggest", "recommend"]):
-        return "advice"
-    if any(word in text_lower for word in ["insult", "stupid", "idiot", "dumb"]):
-        return "insult"
+    # Keyword-based fallback for low-resource labels (single pass over the text)
+    keyword_match = HYBRID_KEYWORD_MATCHER.match(text)
+    if keyword_match:
+        return keyword_match.label
 
     # Check if it's likely an emotion using the pre-trained emotion model
+    emotion_result = None
     try:
-        emotion_result = emotion_classifier(text)
-        predicted_emotion = emotion_result[0]['label']
-        confidence = emotion_result[0]['score']
+        emotion_result = emotion_classifier(text)[0]
+        predicted_emotion = emotion_result['label']
+        confidence = emotion_result['score']
         
         # If confidence is high enough, use emotion mapping
         if confidence > 0.1:  # Lower threshold for better emotion detection
@@ -81,21 +124,77 @@ def hybrid_classifier(text: str):
     
     # Fallback to zero-shot for other intents
     try:
-        zero_shot_result = zero_shot_classifier(text, candidate_labels=ZERO_SHOT_LABELS)
+        zero_shot_result = zero_shot_classifier(
+            text,
+            candidate_labels=ZERO_SHOT_LABELS,
+            priors=zero_shot_priors(text, emotion_result),
+        )
         return zero_shot_result["labels"][0]
     except Exception as e:
         print(f"Zero-shot classification failed: {e}")
         return "greet"  # Default fallback
 
+# Load both models and run them over representative input lengths
+def warm_up_models():
+    emotion_classifier.get()
+    zero_shot_classifier.get()
+    with startup.phase_timer("warmup"):
+        for text in WARMUP_TEXTS:
+            emotion_classifier(text)
+            zero_shot_classifier(text, candidate_labels=ZERO_SHOT_LABELS)
+
+@app.on_event("startup")
+async def start_model_warmup():
+    if MODEL_PRELOAD:
+        startup.run_in_background(warm_up_models)
+
+# Reject with 503 + Retry-After instead of queueing without limit
+@app.exception_handler(InferenceOverloaded)
+async def inference_overloaded_handler(request: Request, exc: InferenceOverloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # API endpoint
 @app.post("/predict")
 async def predict(user_input: UserInput):
     try:
-        predicted_label = hybrid_classifier(user_input.text)
+        # Run on the inference pool so the event loop stays responsive
+        predicted_label = await inference_executor.run(hybrid_classifier, user_input.text)
         return {"input": user_input.text, "predicted_label": predicted_label}
+    except InferenceOverloaded:
+        raise
     except Exception as e:
         return {"input": user_input.text, "predicted_label": "greet", "error": str(e)}
 
+# Micro-batching statistics for tuning batch size and wait time
+@app.get("/stats/batching")
+async def batching_stats():
+    if not emotion_classifier.loaded:
+        return {"loaded": False}
+    stats = emotion_classifier.instance.stats()
+    if zero_shot_classifier.loaded:
+        stats["zero_shot"] = zero_shot_classifier.instance.stats()
+    return stats
+
+# Inference pool occupancy and rejections
+@app.get("/stats/inference")
+async def inference_stats():
+    return inference_executor.stats()
+
+# Liveness probe: the process is up and serving
+@app.get("/healthz")
+async def healthz():
+    return {"status": "alive"}
+
+# Readiness probe: models are loaded and warmed, with startup phase timings
+@app.get("/readyz")
+async def readyz():
+    status = startup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -107,7 +206,7 @@ async def test():
     test_texts = ["hello", "im sad", "im happy", "goodbye", "thank you"]
     results = []
     for text in test_texts:
-        result = hybrid_classifier(text)
+        result = await inference_executor.run(hybrid_classifier, text)
         results.append({"text": text, "predicted": result})
     return {"test_results": results}
 
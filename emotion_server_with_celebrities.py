@@ -1,11 +1,37 @@
 # Install dependencies if not already installed
 # !pip install fastapi uvicorn transformers torch
 
-from fastapi import FastAPI, Request
-from pydantic import BaseModel
-from transformers import pipeline
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, StrictStr
 from fastapi.middleware.cors import CORSMiddleware
-import random
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from inference_executor import InferenceExecutor, InferenceOverloaded, set_torch_threads
+from admission_control import MODES, OverloadController
+from inference_scheduler import MicroBatchScheduler
+from zero_shot import BatchedZeroShotClassifier, zero_shot_priors
+from model_loading import WARMUP_TEXTS, LazyModel, StartupTracker, load_pipeline
+from result_cache import ClassificationCache, normalize_text
+from celebrity_index import CelebrityIndex, dialogue_texts
+from dialogue_ranking import DEFAULT_EMBEDDER, DIALOGUE_EMBEDDINGS_DIR, EmbeddingStore, load_embedder
+from deadline import Deadline, StageCostEstimator
+from single_flight import SingleFlight
+from session_store import SessionStore
+from ngram_classifier import NGRAM_MODEL_PATH, NgramClassifier
+from response_encoding import dumps, encode_fragment, encode_prediction
+from metrics import CONFIDENCE_BUCKETS, MetricsRegistry, RequestMetricsMiddleware
+from media_cache import MEDIA_CACHE_DIR, MediaCache, dataset_media_urls, iter_file_range, parse_range
+try:
+    from websockets.exceptions import ConnectionClosed
+except ImportError:  # uvicorn serving WebSockets through wsproto instead
+    ConnectionClosed = OSError
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import List, Optional
 
 # Start FastAPI app
 app = FastAPI()
@@ -19,19 +45,173 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Prometheus metrics, served on /metrics
+metrics = MetricsRegistry()
+HTTP_REQUESTS = metrics.counter("http_requests_total", "HTTP requests by method, route and status", ["method", "path", "status"])
+HTTP_DURATION = metrics.histogram("http_request_duration_seconds", "HTTP request latency by route", ["path"])
+STAGE_DURATION = metrics.histogram("emotion_stage_duration_seconds", "Time spent in each classification stage", ["stage", "mode"])
+STAGE_ERRORS = metrics.counter("emotion_stage_errors_total", "Classification stage failures", ["stage"])
+CONFIDENCE = metrics.histogram("emotion_confidence", "Top score of model predictions", ["stage"], buckets=CONFIDENCE_BUCKETS)
+CLASSIFICATIONS = metrics.counter("emotion_classifications_total", "Classified texts by deciding stage and label", ["stage", "label", "cached"])
+DEGRADED_STAGES = metrics.counter("emotion_degraded_stages_total", "Stages skipped or cut off by the latency budget", ["stage", "reason"])
+COALESCED_REQUESTS = metrics.counter("classification_coalesced_total", "Requests that waited on an identical in-flight classification")
+DEFAULT_FALLBACKS = metrics.counter("celebrity_default_fallbacks_total", "Responses that fell back to the georgesar greeting", ["reason"])
+MODE_TRANSITIONS = metrics.counter("serving_mode_transitions_total", "Overload controller switches between serving modes", ["from", "to"])
+INFERENCE_REJECTIONS = metrics.counter("inference_rejected_requests_total", "Inference calls rejected with 503 because the pool queue was full")
+app.add_middleware(RequestMetricsMiddleware, requests=HTTP_REQUESTS, durations=HTTP_DURATION)
+
+# Inference executor settings
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "16"))
+INFERENCE_MAX_PENDING = int(os.environ.get("INFERENCE_MAX_PENDING", "64"))
+INFERENCE_RETRY_AFTER_S = int(os.environ.get("INFERENCE_RETRY_AFTER_S", "1"))
+TORCH_NUM_THREADS = int(os.environ.get("TORCH_NUM_THREADS", "0"))
+
+# Overload control: while inference queue delay or model stage latency stays
+# above these thresholds, new requests skip zero-shot, then the emotion model
+# (0 turns a signal off; OVERLOAD_CONTROL=0 turns them all off)
+OVERLOAD_CONTROL = os.environ.get("OVERLOAD_CONTROL", "1") != "0"
+OVERLOAD_QUEUE_DELAY_MS = float(os.environ.get("OVERLOAD_QUEUE_DELAY_MS", "200"))
+OVERLOAD_EMOTION_MODEL_MS = float(os.environ.get("OVERLOAD_EMOTION_MODEL_MS", "500"))
+OVERLOAD_ZERO_SHOT_MS = float(os.environ.get("OVERLOAD_ZERO_SHOT_MS", "2000"))
+OVERLOAD_WINDOW_S = float(os.environ.get("OVERLOAD_WINDOW_S", "5"))
+OVERLOAD_ESCALATE_S = float(os.environ.get("OVERLOAD_ESCALATE_S", "2"))
+OVERLOAD_RECOVER_S = float(os.environ.get("OVERLOAD_RECOVER_S", "10"))
+
+overload_controller = OverloadController(
+    queue_delay_ms=OVERLOAD_QUEUE_DELAY_MS if OVERLOAD_CONTROL else 0,
+    stage_latency_ms={"emotion_model": OVERLOAD_EMOTION_MODEL_MS, "zero_shot": OVERLOAD_ZERO_SHOT_MS} if OVERLOAD_CONTROL else None,
+    window_seconds=OVERLOAD_WINDOW_S,
+    escalate_seconds=OVERLOAD_ESCALATE_S,
+    recover_seconds=OVERLOAD_RECOVER_S,
+    on_transition=lambda source, target: MODE_TRANSITIONS.inc(source, target),
+)
+
+# Blocking model calls run on a dedicated, bounded thread pool
+set_torch_threads(TORCH_NUM_THREADS)
+inference_executor = InferenceExecutor(
+    INFERENCE_WORKERS, INFERENCE_MAX_PENDING, INFERENCE_RETRY_AFTER_S,
+    on_queue_delay=lambda seconds: overload_controller.observe("queue_delay", seconds),
+    on_reject=INFERENCE_REJECTIONS.inc,
+)
+
+# Identical texts arriving while one is being classified wait for that one pass
+classification_flights = SingleFlight()
+
+# Micro-batching settings for the emotion model
+EMOTION_BATCH_MAX_SIZE = int(os.environ.get("EMOTION_BATCH_MAX_SIZE", "16"))
+EMOTION_BATCH_MAX_WAIT_MS = float(os.environ.get("EMOTION_BATCH_MAX_WAIT_MS", "5"))
+
+# Inputs longer than this many tokens keep their head and tail (0 = model limit);
+# batches are split by token length at these edges to limit padding
+EMOTION_MAX_TOKENS = int(os.environ.get("EMOTION_MAX_TOKENS", "256"))
+ZERO_SHOT_MAX_TOKENS = int(os.environ.get("ZERO_SHOT_MAX_TOKENS", "256"))
+TOKEN_BUCKET_EDGES = [int(edge) for edge in os.environ.get("TOKEN_BUCKET_EDGES", "16,32,64,128").split(",") if edge.strip()]
+
+# Load and warm the models in the background at server startup (0 = load on first use only)
+MODEL_PRELOAD = os.environ.get("MODEL_PRELOAD", "1") != "0"
+
+# Inference backend: "torch" (default) or "onnx" (ONNX Runtime, PyTorch as fallback)
+BACKEND_OPTIONS = {
+    "backend": os.environ.get("INFERENCE_BACKEND", "torch"),
+    "quantize": os.environ.get("ONNX_QUANTIZE", "0") == "1",
+    "num_threads": TORCH_NUM_THREADS,
+}
+
+# Startup phase timings and readiness for /readyz
+startup = StartupTracker(require_warmup=MODEL_PRELOAD)
+
 # Initialize Pre-trained Emotion Classifier (FREE model)
-emotion_classifier = pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base")
+# Concurrent single-text calls are gathered into batched forward passes
+emotion_classifier = LazyModel("emotion_model", lambda: MicroBatchScheduler(
+    load_pipeline("text-classification", "j-hartmann/emotion-english-distilroberta-base", **BACKEND_OPTIONS),
+    max_batch_size=EMOTION_BATCH_MAX_SIZE,
+    max_wait_ms=EMOTION_BATCH_MAX_WAIT_MS,
+    max_tokens=EMOTION_MAX_TOKENS,
+    bucket_edges=TOKEN_BUCKET_EDGES,
+), startup)
+
+# Zero-shot pruning: score only the top-k labels by prior (0 = all labels)
+ZERO_SHOT_TOP_K = int(os.environ.get("ZERO_SHOT_TOP_K", "0"))
 
 # Initialize Zero-Shot Classifier for non-emotion intents
-zero_shot_classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+# All hypotheses for a text are scored in one batched NLI pass
+zero_shot_classifier = LazyModel("zero_shot_model", lambda: BatchedZeroShotClassifier(
+    load_pipeline("zero-shot-classification", "facebook/bart-large-mnli", **BACKEND_OPTIONS),
+    top_k=ZERO_SHOT_TOP_K,
+    max_tokens=ZERO_SHOT_MAX_TOKENS,
+    bucket_edges=TOKEN_BUCKET_EDGES,
+), startup)
 
 # Define candidate labels for zero-shot
 ZERO_SHOT_LABELS = [
     "advice", "bye", "greet", "insult", "joke", "random", "song", "story", "thanks"
 ]
 
-# Import real celebrity dataset
-from real_celebrity_dataset import CELEBRITY_DATASET
+# Load the celebrity dataset from its versioned data file
+from dataset_store import DATASET_PATH, DatasetWatcher, load_dataset
+CELEBRITY_DATASET, dataset_info = load_dataset(DATASET_PATH)
+
+# How often to check the dataset file for changes (0 = never reload)
+DATASET_WATCH_INTERVAL_S = float(os.environ.get("DATASET_WATCH_INTERVAL_S", "2"))
+
+# Background sync from the Google Sheet export (0 = off; run dataset_sync.py instead)
+from dataset_sync import SHEET_CSV_URL, DatasetSync
+DATASET_SYNC_INTERVAL_S = float(os.environ.get("DATASET_SYNC_INTERVAL_S", "0"))
+
+# Only one process writes the dataset from the sheet: prefork_server.py clears
+# this in every worker but one (the others pick the file up with their watchers)
+PRIMARY_WORKER = True
+
+# Local content-addressed cache for the dataset's audio and image URLs
+MEDIA_CACHE_ENABLED = os.environ.get("MEDIA_CACHE", "0") == "1"
+media_cache = MediaCache(
+    MEDIA_CACHE_DIR,
+    max_bytes=int(os.environ.get("MEDIA_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+    base_url=os.environ.get("MEDIA_BASE_URL", ""),
+    origin_url=os.environ.get("MEDIA_ORIGIN_URL", ""),
+)
+
+def media_url(url: str):
+    """Cached media are served from /media/{hash}; anything else from its origin"""
+    return media_cache.local_url(url) if MEDIA_CACHE_ENABLED else url
+
+def absolute_media_urls(body: bytes, connection) -> bytes:
+    """Prefix the relative /media URLs in an encoded response with the URL the
+    client reached us at, so a frontend on another origin can load them.
+    Pre-encoded fragments stay relative when MEDIA_BASE_URL isn't set."""
+    if not MEDIA_CACHE_ENABLED or media_cache.base_url:
+        return body
+    base_url = str(connection.base_url).rstrip("/")
+    if base_url.startswith("ws"):  # ws:// or wss:// for /ws/chat
+        base_url = "http" + base_url[2:]
+    # '":"' only occurs between a key and its value: inside a string the quotes are escaped
+    return body.replace(b'":"/media/', b'":' + dumps(base_url)[:-1] + b'/media/')
+
+# Pick among the top-k dialogue lines most similar to the message instead of
+# uniformly (off by default). Line embeddings are computed once per dataset in
+# the background and memory-mapped from DIALOGUE_EMBEDDINGS_DIR after that.
+DIALOGUE_RANKING = os.environ.get("DIALOGUE_RANKING", "0") == "1"
+DIALOGUE_TOP_K = int(os.environ.get("DIALOGUE_TOP_K", "5"))
+DIALOGUE_EMBEDDER = os.environ.get(
+    "DIALOGUE_EMBEDDER", "hashing" if BACKEND_OPTIONS["backend"] == "stub" else DEFAULT_EMBEDDER
+)
+dialogue_embedder = LazyModel("dialogue_embedder", lambda: load_embedder(DIALOGUE_EMBEDDER))
+dialogue_store = EmbeddingStore(DIALOGUE_EMBEDDINGS_DIR)
+dialogue_embeddings = None
+
+# Per-session ring buffers of recent responses and moods, capped in total memory
+sessions = SessionStore(
+    max_bytes=int(os.environ.get("SESSION_MAX_BYTES", str(128 * 1024 * 1024))),
+    idle_seconds=float(os.environ.get("SESSION_IDLE_TTL_S", "1800")),
+    recent_size=int(os.environ.get("SESSION_RECENT_SIZE", "8")),
+    mood_size=int(os.environ.get("SESSION_MOOD_SIZE", "16")),
+)
+
+def get_session(session_id: Optional[str]):
+    return sessions.get(session_id) if session_id else None
+
+# Keyword rules compiled into a single-pass matcher
+from keyword_rules import CELEBRITY_KEYWORD_RULES, CELEBRITY_KEYWORD_MATCHER
 
 # Intelligent Emotion Clustering - Map multiple emotions to your dataset labels
 EMOTION_CLUSTERS = {
@@ -72,173 +252,817 @@ for cluster, emotions in EMOTION_CLUSTERS.items():
 # Define request schema
 class UserInput(BaseModel):
     text: str
+    # Optional conversation id: replies avoid what this session was served recently.
+    # Strict, so a number, list or object is a 422 rather than a stringified key.
+    session_id: Optional[StrictStr] = None
+
+class BatchInput(BaseModel):
+    texts: List[str]
+
+# Max texts accepted by /predict/batch
+PREDICT_BATCH_MAX_SIZE = int(os.environ.get("PREDICT_BATCH_MAX_SIZE", "1000"))
+
+# Messages a /ws/chat connection may have queued before we stop reading from it
+WS_MAX_PENDING = int(os.environ.get("WS_MAX_PENDING", "8"))
+
+# Direct mapping from AI model emotions to our clusters
+AI_TO_CLUSTER = {
+    'joy': 'happy',
+    'sadness': 'sad', 
+    'anger': 'angry',
+    'fear': 'scared',
+    'love': 'romantic',
+    'surprise': 'excited',
+    'neutral': 'greeting'
+}
+
+# Map zero-shot intents to our clusters
+INTENT_TO_CLUSTER = {
+    'greet': 'greeting',
+    'joke': 'humorous',
+    'story': 'story',
+    'insult': 'insult',
+    'advice': 'advice',
+    'bye': 'bye',
+    'thanks': 'thanks',
+    'song': 'song',
+}
+
+# Minimum emotion-model confidence before falling back to zero-shot
+EMOTION_CONFIDENCE_THRESHOLD = 0.1
+
+# Hashed n-gram tier between the keywords and the emotion model (off without a model file);
+# predictions below the threshold go on to the transformer
+NGRAM_CONFIDENCE_THRESHOLD = float(os.environ.get("NGRAM_CONFIDENCE_THRESHOLD", "0.8"))
+ngram_model = NgramClassifier.load(NGRAM_MODEL_PATH)
+
+# Default latency budget for classifying one /predict or /ws/chat message
+# (0 = none); a request can set its own with the X-Latency-Budget-Ms header
+CLASSIFY_BUDGET_MS = float(os.environ.get("CLASSIFY_BUDGET_MS", "0"))
+
+# Observed cost of each model stage, used to skip stages the budget can't cover
+stage_costs = StageCostEstimator()
+
+# Classification result cache settings
+CLASSIFICATION_CACHE_MAX_ENTRIES = int(os.environ.get("CLASSIFICATION_CACHE_MAX_ENTRIES", "10000"))
+CLASSIFICATION_CACHE_TTL_S = float(os.environ.get("CLASSIFICATION_CACHE_TTL_S", "0"))
+CLASSIFICATION_CACHE_MAX_BYTES = int(os.environ.get("CLASSIFICATION_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Fallback when every stage fails
+DEFAULT_CLASSIFICATION = {"label": "greeting", "stage": "default", "rule": None, "scores": {}}
+
+def keyword_classification(text: str):
+    """Classification from the keyword rules, or None if no rule fires"""
+    keyword_match = CELEBRITY_KEYWORD_MATCHER.match(text)
+    if keyword_match:
+        return {"label": keyword_match.label, "stage": "keyword", "rule": keyword_match.keyword, "scores": {}}
+    return None
+
+def ngram_classification(prediction, threshold: float = NGRAM_CONFIDENCE_THRESHOLD):
+    """Classification from one n-gram (label, confidence) prediction, or None if not confident"""
+    label, confidence = prediction
+    if confidence >= threshold:
+        return {
+            "label": EMOTION_TO_CLUSTER.get(label, label),
+            "stage": "ngram",
+            "rule": None,
+            "scores": {label: confidence},
+        }
+    return None
+
+def emotion_model_classification(result, threshold: float = EMOTION_CONFIDENCE_THRESHOLD):
+    """Classification from one emotion-model prediction, or None if not confident"""
+    if result['score'] > threshold:
+        return {
+            "label": AI_TO_CLUSTER.get(result['label'], 'greeting'),
+            "stage": "emotion_model",
+            "rule": None,
+            "scores": {result['label']: result['score']},
+        }
+    return None
+
+def zero_shot_classification(result):
+    """Classification from one zero-shot prediction"""
+    CONFIDENCE.observe(result["scores"][0], "zero_shot")
+    return {
+        "label": INTENT_TO_CLUSTER.get(result["labels"][0], 'greeting'),
+        "stage": "zero_shot",
+        "rule": None,
+        "scores": dict(zip(result["labels"], result["scores"])),
+    }
+
+def model_stage_allowed(stage: str, model: LazyModel, deadline: Deadline, shed=()):
+    """Skip a stage the overload controller sheds; under a budget, also one
+    whose observed cost exceeds what is left, or whose model is still loading"""
+    if stage in shed:
+        DEGRADED_STAGES.inc(stage, "overload")
+        return False
+    if deadline.unlimited:
+        return True
+    if not model.loaded:
+        DEGRADED_STAGES.inc(stage, "not_loaded")
+        return False
+    if not deadline.allows(stage):
+        DEGRADED_STAGES.inc(stage, "budget")
+        return False
+    return True
+
+def record_stage_cost(stage: str, start: float):
+    elapsed = time.perf_counter() - start
+    STAGE_DURATION.observe(elapsed, stage, "single")
+    stage_costs.record(stage, elapsed)
+    overload_controller.observe(stage, elapsed)
+
+def best_effort_classification(emotion_result, ngram_result):
+    """Best answer so far when model stages were skipped, flagged as degraded:
+    even a low-confidence emotion or n-gram guess beats the default"""
+    if emotion_result is not None:
+        classification = emotion_model_classification(emotion_result, threshold=-1.0)
+    elif ngram_result is not None:
+        classification = ngram_classification(ngram_result, threshold=-1.0)
+    else:
+        classification = DEFAULT_CLASSIFICATION
+    return dict(classification, degraded=True)
+
+# Full cascade for one text: keywords -> emotion model -> zero-shot.
+# With a deadline, model stages that don't fit the remaining budget are
+# skipped (or cut off) and the best answer so far is returned as degraded;
+# the same goes for stages in `shed` (skipped under overload).
+def classify_uncached(text: str, deadline: Deadline = None, shed=()):
+    deadline = deadline or Deadline(0, stage_costs)
+
+    # Keyword-based detection with clustering (single pass over the text)
+    with STAGE_DURATION.time("keyword", "single"):
+        classification = keyword_classification(text)
+    if classification:
+        return classification
+
+    # Hashed n-gram model settles confident predictions without a transformer pass
+    ngram_result = None
+    if ngram_model is not None:
+        with STAGE_DURATION.time("ngram", "single"):
+            ngram_result = ngram_model.predict(text)
+        CONFIDENCE.observe(ngram_result[1], "ngram")
+        classification = ngram_classification(ngram_result)
+        if classification:
+            return classification
+
+    # Use AI model for emotion detection
+    degraded = False
+    emotion_result = None
+    if model_stage_allowed("emotion_model", emotion_classifier, deadline, shed):
+        start = time.perf_counter()
+        future = None
+        try:
+            future = emotion_classifier.get().submit(text)
+            emotion_result = future.result(timeout=deadline.timeout())
+            CONFIDENCE.observe(emotion_result['score'], "emotion_model")
+            classification = emotion_model_classification(emotion_result)
+            if classification:
+                return classification
+        except FutureTimeout:
+            # Cut off: the batcher drops the text if it hasn't started yet
+            future.cancel()
+            degraded = True
+            DEGRADED_STAGES.inc("emotion_model", "timeout")
+        except Exception as e:
+            STAGE_ERRORS.inc("emotion_model")
+            print(f"Emotion classification failed: {e}")
+        finally:
+            record_stage_cost("emotion_model", start)
+    else:
+        degraded = True
+
+    # Fallback to zero-shot for other intents
+    if model_stage_allowed("zero_shot", zero_shot_classifier, deadline, shed):
+        start = time.perf_counter()
+        try:
+            zero_shot_result = zero_shot_classifier(
+                text,
+                candidate_labels=ZERO_SHOT_LABELS,
+                priors=zero_shot_priors(text, emotion_result),
+            )
+            classification = zero_shot_classification(zero_shot_result)
+            return dict(classification, degraded=True) if degraded else classification
+        except Exception as e:
+            STAGE_ERRORS.inc("zero_shot")
+            print(f"Zero-shot classification failed: {e}")
+            if not degraded:
+                return DEFAULT_CLASSIFICATION
+        finally:
+            record_stage_cost("zero_shot", start)
+    return best_effort_classification(emotion_result, ngram_result)
+
+# Same cascade as classify_uncached, run stage by stage over many texts;
+# texts left for a stage in `shed` get the best answer so far, as degraded
+def classify_batch_uncached(texts: List[str], shed=()):
+    # Keyword stage resolves what it can without touching the models
+    with STAGE_DURATION.time("keyword", "batch"):
+        classifications = [keyword_classification(text) for text in texts]
+    remaining = [i for i, classification in enumerate(classifications) if classification is None]
+
+    # N-gram tier next, still without the models
+    ngram_results = {}
+    if remaining and ngram_model is not None:
+        with STAGE_DURATION.time("ngram", "batch"):
+            for i in remaining:
+                ngram_results[i] = prediction = ngram_model.predict(texts[i])
+                CONFIDENCE.observe(prediction[1], "ngram")
+                classifications[i] = ngram_classification(prediction)
+        remaining = [i for i in remaining if classifications[i] is None]
+
+    # Emotion model on the rest, in real batches
+    emotion_results = {}
+    if remaining and "emotion_model" in shed:
+        DEGRADED_STAGES.inc("emotion_model", "overload")
+    elif remaining:
+        try:
+            with STAGE_DURATION.time("emotion_model", "batch"):
+                results = emotion_classifier([texts[i] for i in remaining], batch_size=EMOTION_BATCH_MAX_SIZE)
+            for i, result in zip(remaining, results):
+                emotion_results[i] = result
+                CONFIDENCE.observe(result['score'], "emotion_model")
+                classifications[i] = emotion_model_classification(result)
+        except Exception as e:
+            STAGE_ERRORS.inc("emotion_model")
+            print(f"Emotion classification failed: {e}")
+        remaining = [i for i in remaining if classifications[i] is None]
+
+    # Zero-shot only for what is still unresolved
+    if remaining and "zero_shot" in shed:
+        DEGRADED_STAGES.inc("zero_shot", "overload")
+        for i in remaining:
+            classifications[i] = best_effort_classification(emotion_results.get(i), ngram_results.get(i))
+    elif remaining:
+        try:
+            with STAGE_DURATION.time("zero_shot", "batch"):
+                results = zero_shot_classifier(
+                    [texts[i] for i in remaining],
+                    candidate_labels=ZERO_SHOT_LABELS,
+                    batch_size=EMOTION_BATCH_MAX_SIZE,
+                    priors=[zero_shot_priors(texts[i], emotion_results.get(i)) for i in remaining],
+                )
+            for i, result in zip(remaining, results):
+                classifications[i] = zero_shot_classification(result)
+        except Exception as e:
+            STAGE_ERRORS.inc("zero_shot")
+            print(f"Zero-shot classification failed: {e}")
+
+    return [classification or DEFAULT_CLASSIFICATION for classification in classifications]
+
+# Fingerprint of everything a cached classification depends on
+def classification_version():
+    payload = json.dumps(
+        [CELEBRITY_KEYWORD_RULES, ZERO_SHOT_LABELS, AI_TO_CLUSTER, INTENT_TO_CLUSTER,
+         EMOTION_CONFIDENCE_THRESHOLD, dataset_info["checksum"],
+         ngram_model and ngram_model.version, NGRAM_CONFIDENCE_THRESHOLD],
+        sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+# Result cache for repeated chat messages ("hi", "im sad", ...)
+classification_cache = ClassificationCache(
+    max_entries=CLASSIFICATION_CACHE_MAX_ENTRIES,
+    ttl_seconds=CLASSIFICATION_CACHE_TTL_S,
+    max_bytes=CLASSIFICATION_CACHE_MAX_BYTES,
+)
+classification_cache.set_version(classification_version())
+
+# Where a classification came from -> the "cached" label of emotion_classifications_total
+CLASSIFICATION_SOURCES = {"hit": "true", "miss": "false", "coalesced": "coalesced"}
+
+def observe_classification(classification, source: str, shed=()):
+    CLASSIFICATIONS.inc(classification["stage"], classification["label"], CLASSIFICATION_SOURCES[source])
+    if classification["stage"] == "default":
+        if not classification.get("degraded"):
+            DEFAULT_FALLBACKS.inc("classification_failed")
+        else:
+            DEFAULT_FALLBACKS.inc("overload" if shed else "deadline")
+
+def classify_and_cache(text: str, key: str, deadline: Deadline = None, shed=()):
+    classification = classify_uncached(text, deadline, shed)
+    # Degraded answers are not cached: the next request may have time for the full cascade
+    if not classification.get("degraded"):
+        classification_cache.put(key, classification)
+    return classification
+
+def classify_text(text: str):
+    """Classify one text, reusing the cached result for its normalized form"""
+    key = normalize_text(text)
+    return classification_cache.get(key) or classify_and_cache(text, key)
+
+def classify_batch(texts: List[str], shed=()):
+    """Classify many texts; only cache misses go through the cascade"""
+    keys = [normalize_text(text) for text in texts]
+    classifications = [classification_cache.get(key) for key in keys]
+    misses = [i for i, classification in enumerate(classifications) if classification is None]
+    if misses:
+        computed = classify_batch_uncached([texts[i] for i in misses], shed)
+        for i, classification in zip(misses, computed):
+            classifications[i] = classification
+            if not classification.get("degraded"):
+                classification_cache.put(keys[i], classification)
+    missed = set(misses)
+    for i, classification in enumerate(classifications):
+        observe_classification(classification, "miss" if i in missed else "hit", shed)
+    return classifications
 
 # Intelligent Emotion Classifier with Clustering
 def intelligent_emotion_classifier(text: str):
-    text_lower = text.lower()
-
-    # Keyword-based detection with clustering
-    keyword_mappings = [
-        # Happy/Positive
-        (['happy', 'joy', 'excited', 'great', 'wonderful', 'amazing'], 'happy'),
-        (['confident', 'sure', 'certain', 'proud'], 'confident'),
-        (['funny', 'humor', 'laugh', 'hehe', 'joke'], 'humorous'),
-        
-        # Sad/Negative
-        (['sad', 'depressed', 'unhappy', 'miserable', 'down'], 'sad'),
-        (['angry', 'mad', 'furious', 'irritated', 'frustrated'], 'angry'),
-        (['scared', 'fear', 'afraid', 'terrified', 'anxious', 'worried'], 'scared'),
-        
-        # Social
-        (['hello', 'hi', 'hey', 'morning', 'good morning'], 'greeting'),
-        (['love', 'romantic', 'romance', 'passionate'], 'romantic'),
-        (['curious', 'curiosity', 'ask', 'question', 'wonder'], 'curious'),
-        (['confused', 'confusion', 'doubt', 'uncertain', 'puzzled'], 'confused'),
-        
-        # Intent-based
-        (['story', 'tale', 'narrative'], 'story'),
-        (['insult', 'stupid', 'idiot', 'dumb', 'ego'], 'insult'),
-        (['casual', 'normal', 'regular', 'ordinary'], 'casual'),
-        (['bye', 'goodbye', 'see you', 'later'], 'bye'),
-        (['thank', 'thanks', 'grateful'], 'thanks'),
-        (['advice', 'help', 'suggest', 'recommend'], 'advice'),
-        (['sing', 'song', 'music', 'tune', 'melody'], 'song'),
-    ]
-    
-    # Check keywords first
-    for keywords, emotion in keyword_mappings:
-        if any(word in text_lower for word in keywords):
-            return emotion
+    return classify_text(text)["label"]
 
-    # Use AI model for emotion detection
+def batch_emotion_classifier(texts: List[str]):
+    return [classification["label"] for classification in classify_batch(texts)]
+
+# Every label the classifiers can produce, resolved ahead of time by the celebrity index
+KNOWN_LABELS = (
+    set(EMOTION_CLUSTERS) | set(EMOTION_TO_CLUSTER) | set(AI_TO_CLUSTER) | set(AI_TO_CLUSTER.values())
+    | set(INTENT_TO_CLUSTER) | set(INTENT_TO_CLUSTER.values()) | set(ZERO_SHOT_LABELS)
+    | set(ngram_model.labels if ngram_model is not None else ())
+)
+
+# The static part of a /predict body for one dataset entry, encoded once per index build
+def encode_entry_fragment(entry):
+    response = entry["response"]
+    return encode_fragment(entry["celebrity"], media_url(response["image"]), response["text"], media_url(response["audio"]))
+
+def build_celebrity_index(dataset, embeddings=None, base=None, changed=()):
+    return CelebrityIndex(
+        dataset, KNOWN_LABELS, EMOTION_TO_CLUSTER, fragment=encode_entry_fragment, embeddings=embeddings,
+        base=base, changed=changed,
+    )
+
+# Precomputed index for celebrity selection, swapped as a whole when the dataset changes
+celebrity_index = build_celebrity_index(CELEBRITY_DATASET)
+_index_lock = threading.Lock()
+
+def set_celebrity_dataset(dataset, info, changed=None):
+    """Build the index for a new dataset off to the side, then swap it in;
+    with `changed` (emotions a sync touched), only those are rebuilt"""
+    global CELEBRITY_DATASET, dataset_info, celebrity_index, dialogue_embeddings
+    with _index_lock:
+        if changed is None:
+            index = build_celebrity_index(dataset)
+        else:
+            index = build_celebrity_index(dataset, base=celebrity_index, changed=changed)
+        CELEBRITY_DATASET, dataset_info, celebrity_index = dataset, info, index
+        dialogue_embeddings = None
+    classification_cache.set_version(classification_version())
+    if MEDIA_CACHE_ENABLED:
+        media_cache.prefetch_in_background(dataset_media_urls(dataset), on_done=refresh_media_urls)
+    if DIALOGUE_RANKING:
+        embed_dialogue_in_background(dataset)
+
+def refresh_media_urls():
+    """Re-encode the fragments so newly cached media are served from /media"""
+    global celebrity_index
+    with _index_lock:
+        celebrity_index = build_celebrity_index(CELEBRITY_DATASET, dialogue_embeddings)
+
+def embed_dialogue(dataset):
+    """Embed (or map from disk) every dialogue line of a dataset, then swap in a
+    ranking index; until then responses are picked uniformly"""
+    global celebrity_index, dialogue_embeddings
     try:
-        emotion_result = emotion_classifier(text)
-        predicted_emotion = emotion_result[0]['label']
-        confidence = emotion_result[0]['score']
-        
-        # Map AI model emotions to our clusters
-        if confidence > 0.1:
-            # Direct mapping from AI model to our clusters
-            ai_to_cluster = {
-                'joy': 'happy',
-                'sadness': 'sad', 
-                'anger': 'angry',
-                'fear': 'scared',
-                'love': 'romantic',
-                'surprise': 'excited',
-                'neutral': 'greeting'
-            }
-            
-            mapped_emotion = ai_to_cluster.get(predicted_emotion, 'greeting')
-            return mapped_emotion
-            
+        embeddings = dialogue_store.matrix(dialogue_texts(dataset), dialogue_embedder.get())
     except Exception as e:
-        print(f"Emotion classification failed: {e}")
-    
-    # Fallback to zero-shot for other intents
+        print(f"Dialogue embedding failed, responses stay random: {e}")
+        return
+    with _index_lock:
+        # A newer dataset may have been swapped in meanwhile; it embeds itself
+        if CELEBRITY_DATASET is dataset:
+            dialogue_embeddings = embeddings
+            celebrity_index = build_celebrity_index(dataset, embeddings)
+
+def embed_dialogue_in_background(dataset):
+    thread = threading.Thread(target=embed_dialogue, args=(dataset,), name="dialogue-embedding", daemon=True)
+    thread.start()
+    return thread
+
+def embed_queries(texts: List[str]):
+    """Embeddings of user messages for ranking, or None while the index can't rank"""
+    if celebrity_index.embeddings is None:
+        return None
     try:
-        zero_shot_result = zero_shot_classifier(text, candidate_labels=ZERO_SHOT_LABELS)
-        predicted_intent = zero_shot_result["labels"][0]
-        
-        # Map zero-shot results to our clusters
-        intent_to_cluster = {
-            'greet': 'greeting',
-            'joke': 'humorous',
-            'story': 'story',
-            'insult': 'insult',
-            'advice': 'advice',
-            'bye': 'bye',
-            'thanks': 'thanks',
-            'song': 'song',
-        }
-        
-        return intent_to_cluster.get(predicted_intent, 'greeting')
-        
+        with STAGE_DURATION.time("dialogue_embedding", "batch" if len(texts) > 1 else "single"):
+            return dialogue_embedder.get().embed(texts)
     except Exception as e:
-        print(f"Zero-shot classification failed: {e}")
-        return "greeting"  # Default fallback
+        STAGE_ERRORS.inc("dialogue_embedding")
+        print(f"Query embedding failed: {e}")
+        return None
+
+async def query_embeddings(texts: List[str]):
+    """embed_queries() on the inference pool; None without ranking"""
+    if not DIALOGUE_RANKING or celebrity_index.embeddings is None:
+        return None
+    return await inference_executor.run(embed_queries, texts)
+
+# Swaps in a new dataset and index whenever the data file changes
+dataset_watcher = DatasetWatcher(DATASET_PATH, set_celebrity_dataset, DATASET_WATCH_INTERVAL_S)
+
+def apply_dataset_sync(dataset, info, diff):
+    """Swap in a synced dataset without reading the file back, re-encoding
+    only the entries of the emotions its diff touched"""
+    changed = {emotion for keys in diff.values() for emotion, _ in keys}
+    dataset_watcher.swap(dataset, info, lambda dataset, info: set_celebrity_dataset(dataset, info, changed))
+
+# Writes only changed records to the data file, then applies them right away
+dataset_sync = DatasetSync(SHEET_CSV_URL, DATASET_PATH, on_update=apply_dataset_sync)
 
 # Enhanced Random Celebrity Selection
-def get_random_celebrity_response(emotion: str):
-    """Get a random celebrity response for the given emotion"""
-    
-    # First, try to find the emotion in our dataset
-    if emotion in CELEBRITY_DATASET:
-        celebrities = list(CELEBRITY_DATASET[emotion].keys())
-        if celebrities:
-            selected_celebrity = random.choice(celebrities)
-            return {
-                "emotion": emotion,
-                "celebrity": selected_celebrity,
-                "response": CELEBRITY_DATASET[emotion][selected_celebrity]
-            }
-    
-    # If emotion not found, try to find similar emotions
-    similar_emotions = []
-    for dataset_emotion in CELEBRITY_DATASET.keys():
-        if emotion in dataset_emotion or dataset_emotion in emotion:
-            similar_emotions.append(dataset_emotion)
-    
-    if similar_emotions:
-        # Choose random similar emotion
-        chosen_emotion = random.choice(similar_emotions)
-        celebrities = list(CELEBRITY_DATASET[chosen_emotion].keys())
-        selected_celebrity = random.choice(celebrities)
-        return {
-            "emotion": chosen_emotion,
-            "celebrity": selected_celebrity,
-            "response": CELEBRITY_DATASET[chosen_emotion][selected_celebrity]
-        }
-    
-    # Final fallback - use greeting
-    if 'greeting' in CELEBRITY_DATASET:
-        celebrities = list(CELEBRITY_DATASET['greeting'].keys())
-        selected_celebrity = random.choice(celebrities)
-        return {
-            "emotion": "greeting",
-            "celebrity": selected_celebrity,
-            "response": CELEBRITY_DATASET['greeting'][selected_celebrity]
-        }
-    
-    # Ultimate fallback
+def get_random_celebrity_response(emotion: str, query=None, session=None):
+    """Get a random celebrity response for the given emotion; with the message's
+    embedding, random among the lines closest to it. With a session, responses
+    it was served recently are avoided and this one is remembered."""
+    index = celebrity_index
+    avoid = session.recent_keys() if session is not None else None
+    if query is not None:
+        celebrity_response = index.pick_ranked(emotion, query, DIALOGUE_TOP_K, avoid=avoid)
+    else:
+        celebrity_response = index.pick(emotion, avoid=avoid)
+    if celebrity_response is index.default:
+        DEFAULT_FALLBACKS.inc("no_dataset_entry")
+    if session is not None:
+        sessions.record(session, celebrity_response["key"], emotion)
+    return celebrity_response
+
+# Load both models and run them over representative input lengths
+def warm_up_models():
+    emotion_classifier.get()
+    zero_shot_classifier.get()
+    with startup.phase_timer("warmup"):
+        for text in WARMUP_TEXTS:
+            # Also seeds the stage cost estimates used by latency budgets
+            start = time.perf_counter()
+            emotion_classifier(text)
+            stage_costs.record("emotion_model", time.perf_counter() - start)
+            start = time.perf_counter()
+            zero_shot_classifier(text, candidate_labels=ZERO_SHOT_LABELS)
+            stage_costs.record("zero_shot", time.perf_counter() - start)
+
+@app.on_event("startup")
+async def start_model_warmup():
+    if MODEL_PRELOAD:
+        startup.run_in_background(warm_up_models)
+    if DATASET_WATCH_INTERVAL_S > 0:
+        dataset_watcher.start()
+    if DATASET_SYNC_INTERVAL_S > 0 and PRIMARY_WORKER:
+        dataset_sync.start(DATASET_SYNC_INTERVAL_S)
+    # Pre-forked workers run these too, but file locks make one of them do
+    # the downloads and embedding while the others reuse its files
+    if MEDIA_CACHE_ENABLED:
+        media_cache.prefetch_in_background(dataset_media_urls(CELEBRITY_DATASET), on_done=refresh_media_urls)
+    if DIALOGUE_RANKING:
+        embed_dialogue_in_background(CELEBRITY_DATASET)
+
+# Reject with 503 + Retry-After instead of queueing without limit
+@app.exception_handler(InferenceOverloaded)
+async def inference_overloaded_handler(request: Request, exc: InferenceOverloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# Encode the /predict response for one text and its classification: only the
+# input, emotion and stage are encoded per request, the celebrity part is pre-encoded
+def build_prediction_response(text: str, classification, celebrity_response=None, query=None, session=None) -> bytes:
+    # Get random celebrity response
+    if celebrity_response is None:
+        celebrity_response = get_random_celebrity_response(classification["label"], query, session)
+    return encode_prediction(
+        text, classification["label"], classification["stage"],
+        classification.get("degraded", False), celebrity_response["fragment"],
+    )
+
+# Default response when classification fails
+def build_fallback_response(text: str, error: Exception):
+    DEFAULT_FALLBACKS.inc("error")
     return {
-        "emotion": "greeting",
+        "input": text,
+        "predicted_emotion": "greeting",
+        "stage": "default",
+        "degraded": True,
         "celebrity": "georgesar",
-        "response": {
-            "image": "",
-            "text": "helloooo",
-            "audio": "https://drive.google.com/uc?export=download&id=1wwRDYJIKtO9QMDuw7lmYD6gHqYjlwBw3"
-        }
+        "image_url": "",
+        "dialogue_text": "helloooo",
+        "audio_url": media_url("https://drive.google.com/uc?export=download&id=1wwRDYJIKtO9QMDuw7lmYD6gHqYjlwBw3"),
+        "error": str(error)
     }
 
+# Use intelligent emotion classification; cache hits skip the inference pool
+async def classify_request(text: str, budget_ms: float = CLASSIFY_BUDGET_MS):
+    """(classification, source) for one request; source is "hit", "miss" or "coalesced" """
+    # The budget starts now, so time spent waiting for a worker counts too
+    deadline = Deadline(budget_ms, stage_costs)
+    key = normalize_text(text)
+    classification = classification_cache.get(key)
+    if classification is not None:
+        observe_classification(classification, "hit")
+        return classification, "hit"
+    # Under overload, misses skip the stages the controller sheds
+    shed = overload_controller.shed_stages()
+    # Run on the inference pool so the event loop stays responsive. Requests
+    # for the same text (budget and mode) while that runs share its result;
+    # each still picks its own celebrity from it.
+    classification, shared = await classification_flights.run(
+        (key, budget_ms, shed),
+        lambda: inference_executor.run(classify_and_cache, text, key, deadline, shed),
+    )
+    source = "coalesced" if shared else "miss"
+    if shared:
+        COALESCED_REQUESTS.inc()
+    observe_classification(classification, source, shed)
+    return classification, source
+
 # API endpoint
+def request_budget_ms(value, default: float = CLASSIFY_BUDGET_MS):
+    """Latency budget from a header/message value, the default if missing or invalid"""
+    try:
+        return max(0.0, float(value)) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
 @app.post("/predict")
-async def predict(user_input: UserInput):
+async def predict(user_input: UserInput, request: Request):
     try:
-        # Use intelligent emotion classification
-        predicted_emotion = intelligent_emotion_classifier(user_input.text)
-        
-        # Get random celebrity response
-        celebrity_response = get_random_celebrity_response(predicted_emotion)
-        
-        return {
-            "input": user_input.text,
-            "predicted_emotion": predicted_emotion,
-            "celebrity": celebrity_response["celebrity"],
-            "image_url": celebrity_response["response"]["image"],
-            "dialogue_text": celebrity_response["response"]["text"],
-            "audio_url": celebrity_response["response"]["audio"]
+        start = time.perf_counter()
+        budget_ms = request_budget_ms(request.headers.get("x-latency-budget-ms"))
+        # The message is embedded for dialogue ranking while it is classified
+        (classification, source), queries = await asyncio.gather(
+            classify_request(user_input.text, budget_ms), query_embeddings([user_input.text])
+        )
+        classify_ms = (time.perf_counter() - start) * 1000.0
+        # Which stage decided and how long classification took, for load tests
+        headers = {
+            "X-Emotion-Stage": classification["stage"],
+            "X-Classification-Cache": source,
+            "X-Serving-Mode": overload_controller.mode,
+            "Server-Timing": f"classify;dur={classify_ms:.2f}",
         }
+        body = build_prediction_response(
+            user_input.text, classification,
+            query=None if queries is None else queries[0], session=get_session(user_input.session_id),
+        )
+        return Response(absolute_media_urls(body, request), media_type="application/json", headers=headers)
+    except InferenceOverloaded:
+        raise
     except Exception as e:
-        return {
-            "input": user_input.text,
-            "predicted_emotion": "greeting",
-            "celebrity": "georgesar",
-            "image_url": "",
-            "dialogue_text": "helloooo",
-            "audio_url": "https://drive.google.com/uc?export=download&id=1wwRDYJIKtO9QMDuw7lmYD6gHqYjlwBw3",
-            "error": str(e)
-        }
+        body = dumps(build_fallback_response(user_input.text, e))
+        return Response(absolute_media_urls(body, request), media_type="application/json")
+
+# Batch endpoint: one model pass per stage for the whole list, results in input order
+@app.post("/predict/batch")
+async def predict_batch(batch_input: BatchInput, request: Request):
+    texts = batch_input.texts
+    if len(texts) > PREDICT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(texts)} texts exceeds the limit of {PREDICT_BATCH_MAX_SIZE}",
+        )
+    try:
+        classifications, queries = await asyncio.gather(
+            inference_executor.run(classify_batch, texts, overload_controller.shed_stages()), query_embeddings(texts)
+        )
+        queries = queries if queries is not None else [None] * len(texts)
+        results = [
+            build_prediction_response(text, classification, query=query)
+            for text, classification, query in zip(texts, classifications, queries)
+        ]
+    except InferenceOverloaded:
+        raise
+    except Exception as e:
+        results = [dumps(build_fallback_response(text, e)) for text in texts]
+    return Response(
+        absolute_media_urls(b'{"results":[' + b",".join(results) + b"]}", request), media_type="application/json",
+        headers={"X-Serving-Mode": overload_controller.mode},
+    )
+
+# A /ws/chat frame: {"type": ..., "id": ..., <fields of body>}
+def chat_frame(frame_type: str, message_id, body: bytes) -> str:
+    head = b'{"type":' + dumps(frame_type) + b',"id":' + dumps(message_id) + b","
+    return (head + body[1:]).decode("utf-8")
+
+class InvalidChatMessage(ValueError):
+    """A JSON /ws/chat message without a string "text", or with a non-string "session_id" """
+
+    def __init__(self, message_id, reason: str):
+        super().__init__(reason)
+        self.message_id = message_id
+
+def parse_chat_message(message: str):
+    """(id, text, budget_ms, session_id) from a JSON {"id", "text"[, "budget_ms", "session_id"]}
+    message or a plain-text one; raises InvalidChatMessage if "text" isn't a string
+    or "session_id" is neither a string nor absent/null"""
+    if message.startswith("{"):
+        try:
+            data = json.loads(message)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            text = data.get("text")
+            if not isinstance(text, str):
+                raise InvalidChatMessage(data.get("id"), f'"text" must be a string, got {type(text).__name__}')
+            session_id = data.get("session_id")
+            if session_id is not None and not isinstance(session_id, str):
+                raise InvalidChatMessage(
+                    data.get("id"), f'"session_id" must be a string, got {type(session_id).__name__}'
+                )
+            return data.get("id"), text, request_budget_ms(data.get("budget_ms")), session_id or None
+    return None, message, CLASSIFY_BUDGET_MS, None
+
+async def answer_chat_messages(websocket: WebSocket, pending: asyncio.Queue):
+    """Answer queued messages in order with a "prediction" frame carrying the
+    same fields as /predict, or an "error" frame"""
+    while True:
+        raw = await pending.get()
+        try:
+            message_id, text, budget_ms, session_id = parse_chat_message(raw)
+        except InvalidChatMessage as e:
+            await websocket.send_text(chat_frame("error", e.message_id, dumps({"error": str(e)})))
+            continue
+        try:
+            (classification, _), queries = await asyncio.gather(
+                classify_request(text, budget_ms), query_embeddings([text])
+            )
+        except InferenceOverloaded as e:
+            await websocket.send_text(chat_frame("error", message_id, dumps({"error": str(e), "retry_after": e.retry_after})))
+            continue
+        except Exception as e:
+            body = dumps(build_fallback_response(text, e))
+            await websocket.send_text(chat_frame("prediction", message_id, absolute_media_urls(body, websocket)))
+            continue
+        body = build_prediction_response(
+            text, classification,
+            query=None if queries is None else queries[0], session=get_session(session_id),
+        )
+        await websocket.send_text(chat_frame("prediction", message_id, absolute_media_urls(body, websocket)))
+
+# Persistent chat connection: many messages, one response pair each
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket):
+    await websocket.accept()
+    pending = asyncio.Queue(maxsize=WS_MAX_PENDING)
+    responder = asyncio.create_task(answer_chat_messages(websocket, pending))
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            text = message.get("text")
+            if text is None:
+                text = (message.get("bytes") or b"").decode("utf-8", "replace")
+            # Waits while the queue is full: we stop reading, and TCP flow
+            # control pushes back on a client that sends faster than we answer.
+            # Messages are parsed by the responder so error frames keep their order.
+            enqueue = asyncio.ensure_future(pending.put(text))
+            await asyncio.wait({enqueue, responder}, return_when=asyncio.FIRST_COMPLETED)
+            if responder.done():
+                # Sending failed (client gone); stop reading too
+                enqueue.cancel()
+                break
+    finally:
+        responder.cancel()
+        try:
+            await responder
+        except (asyncio.CancelledError, WebSocketDisconnect, ConnectionClosed, OSError):
+            # Closed by us, or sending failed because the client is gone
+            pass
+        except Exception as e:
+            print(f"Chat responder failed: {e!r}")
+
+# Micro-batching statistics for tuning batch size and wait time
+@app.get("/stats/batching")
+async def batching_stats():
+    if not emotion_classifier.loaded:
+        return {"loaded": False}
+    stats = emotion_classifier.instance.stats()
+    if zero_shot_classifier.loaded:
+        stats["zero_shot"] = zero_shot_classifier.instance.stats()
+    return stats
+
+# Scrape-time gauges over the existing stats
+metrics.gauge("model_startup_phase_seconds", "Duration of model load and warm-up phases", lambda: dict(startup.timings), ["phase"])
+metrics.gauge("model_loaded", "1 once a model is loaded", lambda: {model.name: int(model.loaded) for model in startup.models}, ["model"])
+metrics.gauge("model_ready", "1 once /readyz reports ready", lambda: int(startup.is_ready()))
+metrics.gauge("inference_pending_requests", "Requests running or waiting on the inference pool", lambda: inference_executor.pending)
+metrics.gauge(
+    "classification_cache_events", "Classification cache hits, misses and evictions since startup",
+    lambda: {event: classification_cache.stats()[event] for event in ("hits", "misses", "evictions", "expirations")},
+    ["event"],
+)
+metrics.gauge("classification_cache_entries", "Entries in the classification cache", lambda: classification_cache.stats()["entries"])
+metrics.gauge(
+    "emotion_batcher_queue_depth", "Texts waiting for the emotion-model batcher",
+    lambda: emotion_classifier.instance.queue.qsize() if emotion_classifier.loaded else 0,
+)
+metrics.gauge(
+    "model_padding_waste_ratio", "Share of padded batch tokens that are padding",
+    lambda: {model: lazy.instance.buckets.stats()["padding_waste"]
+             for model, lazy in (("emotion_model", emotion_classifier), ("zero_shot_model", zero_shot_classifier)) if lazy.loaded},
+    ["model"],
+)
+metrics.gauge(
+    "model_truncated_inputs", "Inputs cut to the token cap",
+    lambda: {model: lazy.instance.buckets.truncated
+             for model, lazy in (("emotion_model", emotion_classifier), ("zero_shot_model", zero_shot_classifier)) if lazy.loaded},
+    ["model"],
+)
+metrics.gauge("emotion_stage_cost_estimate_seconds", "Observed stage cost used for latency budgets", lambda: dict(stage_costs.costs), ["stage"])
+metrics.gauge(
+    "serving_mode", "1 for the serving mode the overload controller has new requests in",
+    lambda: {mode: int(mode == overload_controller.mode) for mode in MODES}, ["mode"],
+)
+metrics.gauge("serving_mode_pressure", "Overload signal relative to its threshold (1 sheds the next stage)",
+              lambda: overload_controller.stats()["pressure"])
+metrics.gauge("chat_sessions", "Conversation sessions held in memory", lambda: len(sessions))
+metrics.gauge("chat_session_bytes", "Memory reserved by conversation sessions", lambda: len(sessions) * sessions.bytes_per_session)
+metrics.gauge("celebrity_dataset_records", "Records in the active celebrity dataset", lambda: dataset_info["records"])
+
+# Prometheus text format; everything above is a counter add or a histogram
+# bisect per request, so it can stay on in production
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Inference pool occupancy and rejections
+@app.get("/stats/inference")
+async def inference_stats():
+    return dict(
+        inference_executor.stats(),
+        single_flight=classification_flights.stats(),
+        overload=overload_controller.stats(),
+    )
+
+# Classification cache hit/miss/eviction counters
+@app.get("/stats/cache")
+async def cache_stats():
+    return classification_cache.stats()
+
+# Session store size, memory and evictions
+@app.get("/stats/sessions")
+async def session_stats():
+    return sessions.stats()
+
+# One session's mood trajectory and memory footprint
+@app.get("/sessions/{session_id}")
+async def session_info(session_id: str):
+    session = sessions.peek(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return sessions.describe(session)
+
+@app.get("/stats/media")
+async def media_stats():
+    return {"enabled": MEDIA_CACHE_ENABLED, **media_cache.stats()}
+
+# Cached audio/image by content hash, with Range support; the content never
+# changes for a hash, so it's cacheable forever
+@app.get("/media/{digest}")
+async def get_media(digest: str, request: Request):
+    # The file is opened under the cache lock, so an eviction between the
+    # lookup and the read can't pull it away (an open file stays readable)
+    cached = media_cache.open(digest)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    f, meta = cached
+    size = meta["size"]
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in if_none_match or if_none_match.strip() == "*":
+        f.close()
+        return Response(status_code=304, headers=headers)
+
+    start, end, status_code = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            f.close()
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(iter_file_range(f, start, end), status_code=status_code,
+                             headers=headers, media_type=meta["content_type"])
+
+# Liveness probe: the process is up and serving
+@app.get("/healthz")
+async def healthz():
+    return {"status": "alive"}
+
+# Readiness probe: models are loaded and warmed, with startup phase timings
+@app.get("/readyz")
+async def readyz():
+    status = startup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
 
 # Health check endpoint
 @app.get("/")
@@ -251,11 +1075,14 @@ async def test():
     test_texts = ["hello", "im sad", "im happy", "im angry", "im scared", "im in love", "tell me a story"]
     results = []
     for text in test_texts:
-        result = intelligent_emotion_classifier(text)
+        classification = await inference_executor.run(classify_text, text)
+        result = classification["label"]
         celebrity_response = get_random_celebrity_response(result)
         results.append({
             "text": text,
             "predicted_emotion": result,
+            "stage": classification["stage"],
+            "keyword_rule": classification["rule"],
             "celebrity": celebrity_response["celebrity"],
             "dialogue_text": celebrity_response["response"]["text"]
         })
@@ -267,7 +1094,17 @@ async def get_emotions():
     return {
         "available_emotions": list(CELEBRITY_DATASET.keys()),
         "emotion_clusters": EMOTION_CLUSTERS,
-        "total_celebrities": sum(len(celebrities) for celebrities in CELEBRITY_DATASET.values())
+        "total_celebrities": celebrity_index.total_celebrities(),
+        "dataset_version": dataset_info["checksum"],
+        "dataset_schema_version": dataset_info["schema_version"],
+        "dataset_records": dataset_info["records"],
+        "dataset_last_sync": dataset_sync.last_result,
+        "dialogue_ranking": {
+            "enabled": DIALOGUE_RANKING,
+            "ready": celebrity_index.embeddings is not None,
+            "embedder": DIALOGUE_EMBEDDER,
+            "top_k": DIALOGUE_TOP_K,
+        },
     }
 
 if __name__ == "__main__":
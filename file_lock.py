@@ -0,0 +1,28 @@
+import contextlib
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: no pre-fork workers, so no other process to exclude
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """Exclusive lock across processes on `path` (created if missing).
+
+    Pre-forked workers share the caches on disk; holding this around a
+    rebuild makes one process do the work while the others wait and then
+    find the result in place.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -1,31 +1,22 @@
-import re
+from dataset_store import DATASET_PATH, load_dataset, write_dataset
 
-def update_dataset_images():
+def update_dataset_images(path=DATASET_PATH):
     """Update all empty image URLs in the dataset with placeholder images"""
     
-    # Read the current dataset file
-    with open('real_celebrity_dataset.py', 'r', encoding='utf-8') as f:
-        content = f.read()
+    dataset, _ = load_dataset(path)
     
-    # Find all celebrity names and update their images
-    celebrities = [
-        'dharmajan', 'dileep', 'lalualex', 'lalstory', 'jayaram', 'vinayakan',
-        'georgesar', 'rimitomi', 'nivin', 'prithviraj', 'suraj', 'chembanvinod'
-    ]
+    # Fill in a placeholder avatar for every celebrity without an image
+    updated = 0
+    for characters in dataset.values():
+        for celebrity, response in characters.items():
+            if not response["image"]:
+                response["image"] = f"https://ui-avatars.com/api/?name={celebrity}&background=random&color=fff&size=128&rounded=true&bold=true"
+                updated += 1
     
-    # Update each celebrity's image
-    for celebrity in celebrities:
-        # Pattern to match empty image URLs for this celebrity
-        pattern = f'"{celebrity}": {{\n            "image": "",'
-        replacement = f'"{celebrity}": {{\n            "image": "https://ui-avatars.com/api/?name={celebrity}&background=random&color=fff&size=128&rounded=true&bold=true",'
-        
-        content = content.replace(pattern, replacement)
+    # Write the updated dataset back
+    write_dataset(dataset, path)
     
-    # Write the updated content back
-    with open('real_celebrity_dataset.py', 'w', encoding='utf-8') as f:
-        f.write(content)
-    
-    print("✅ Updated all celebrity images with placeholder avatars!")
+    print(f"✅ Updated {updated} celebrity images with placeholder avatars!")
 
 if __name__ == "__main__":
-    update_dataset_images() 
\ No newline at end of file
+    update_dataset_images()
@@ -0,0 +1,82 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class InferenceOverloaded(Exception):
+    """Raised when the inference queue is full; maps to 503 + Retry-After"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """Dedicated thread pool for blocking model inference.
+
+    Keeps torch forward passes off the asyncio event loop and bounds the
+    number of requests that may be running or waiting for a worker, so
+    excess load is rejected instead of queueing without limit.
+    `on_queue_delay(seconds)`, if given, is called from the worker with how
+    long each call waited for a free worker; `on_reject()` for every call
+    rejected with InferenceOverloaded.
+    """
+
+    def __init__(self, workers: int = 16, max_pending: int = 64, retry_after: int = 1, on_queue_delay=None,
+                 on_reject=None):
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self.retry_after = retry_after
+        self.on_queue_delay = on_queue_delay
+        self.on_reject = on_reject
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        # Only touched from the event loop thread, so no lock is needed
+        self.pending = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool or raise InferenceOverloaded"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            if self.on_reject is not None:
+                self.on_reject()
+            raise InferenceOverloaded(self.retry_after)
+        call = functools.partial(fn, *args, **kwargs)
+        if self.on_queue_delay is not None:
+            call = functools.partial(self._timed, time.perf_counter(), call)
+        loop = asyncio.get_running_loop()
+        future = self.pool.submit(call)
+        self.pending += 1
+        # Released when the call actually finishes: a cancelled caller stops
+        # waiting, but a call already running keeps its worker until it returns
+        future.add_done_callback(lambda _: self._release_soon(loop))
+        return await asyncio.wrap_future(future)
+
+    def _release_soon(self, loop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:  # loop already closed at shutdown
+            pass
+
+    def _release(self):
+        self.pending -= 1
+
+    def _timed(self, submitted: float, call):
+        self.on_queue_delay(time.perf_counter() - submitted)
+        return call()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "rejected": self.rejected,
+        }
+
+
+def set_torch_threads(num_threads: int):
+    """Set torch intra-op threads; 0 keeps the torch default"""
+    if num_threads > 0:
+        import torch
+        torch.set_num_threads(num_threads)
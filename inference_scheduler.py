@@ -0,0 +1,178 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from token_limits import LengthBuckets, cap_text
+
+
+def _bucket(value: int):
+    """Power-of-two histogram bucket (1, 2, 4, 8, ...) for a count"""
+    bucket = 1
+    while bucket < value:
+        bucket *= 2
+    return bucket
+
+
+class MicroBatchScheduler:
+    """Dynamic micro-batching in front of a transformers text-classification pipeline.
+
+    Single-text calls from concurrent request handlers are queued and
+    flushed as one batched forward pass when `max_batch_size` texts are
+    waiting or the oldest one has waited `max_wait_ms`. Calling the
+    scheduler with one string behaves like calling the pipeline itself.
+
+    With `max_tokens`, texts are cut to that many tokens (head and tail
+    kept) on the batcher thread. Each flushed batch is split by token
+    length into `bucket_edges` buckets, one forward pass per bucket, so a
+    pasted wall of text doesn't pad short chat messages up to its length.
+
+    A fast tokenizer can't be used from two threads at once (the pipeline
+    switches its truncation and padding settings per call, and a clash
+    raises "Already borrowed"), so every use of the pipeline's tokenizer
+    happens under one lock: the batcher holds it for each batch, and list
+    or pass-through calls from other threads wait for it.
+    """
+
+    def __init__(self, pipe, max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 max_tokens: int = 0, bucket_edges=()):
+        self.pipe = pipe
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_tokens = max_tokens
+        self.tokenizer = getattr(pipe, "tokenizer", None)
+        self.buckets = LengthBuckets(bucket_edges)
+        self.queue = queue.Queue()
+        self.batch_sizes = Counter()
+        self.queue_depths = Counter()
+        self.batches = 0
+        self.items = 0
+        self._lock = threading.Lock()
+        self._tokenizer_lock = threading.Lock()
+        self._worker = None
+        # Threads don't survive fork(): a pre-forked worker starts its own
+        # batcher with a fresh queue instead of using the parent's
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._tokenizer_lock = threading.Lock()
+        self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="emotion-batcher", daemon=True)
+                    self._worker.start()
+
+    def prepare(self, text: str):
+        """(text, token_count): capped to max_tokens, counted for bucketing.
+        Without a tokenizer the UTF-8 length stands in for the token count.
+        Call with _tokenizer_lock held."""
+        if self.tokenizer is None:
+            return text, len(text.encode("utf-8"))
+        text, length, truncated = cap_text(self.tokenizer, text, self.max_tokens)
+        if truncated:
+            self.buckets.record_truncated()
+        return text, length
+
+    def submit(self, text: str) -> Future:
+        """Queue one text and return a Future for its top prediction"""
+        self._ensure_worker()
+        future = Future()
+        # Capped and counted by the batcher, which owns the tokenizer
+        self.queue.put((text, future))
+        return future
+
+    def __call__(self, text, batch_size: int = None, **kwargs):
+        # Non-default arguments go straight to the pipeline
+        if kwargs:
+            with self._tokenizer_lock:
+                return self.pipe(text, batch_size=batch_size, **kwargs) if batch_size else self.pipe(text, **kwargs)
+        if isinstance(text, str):
+            return [self.submit(text).result()]
+        # A list is run right away, bucketed by length, results in input order
+        with self._tokenizer_lock:
+            items = [self.prepare(t) + (i,) for i, t in enumerate(text)]
+            results = [None] * len(items)
+            for bucket, group in self.buckets.group(items).items():
+                for start in range(0, len(group), batch_size or self.max_batch_size):
+                    chunk = group[start:start + (batch_size or self.max_batch_size)]
+                    for (_, _, i), result in zip(chunk, self._forward(bucket, chunk)):
+                        results[i] = result
+        return results
+
+    def _forward(self, bucket: str, items):
+        """One forward pass over (text, length, ...) items of one bucket
+        (_tokenizer_lock held)"""
+        self.buckets.record(bucket, [item[1] for item in items])
+        texts = [item[0] for item in items]
+        return self.pipe(texts, batch_size=len(texts), truncation=True)
+
+    def _collect(self):
+        """Block for the first item, then gather more until size or wait limit"""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            depth = len(batch) + self.queue.qsize()
+
+            # Drop callers that gave up while waiting
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.batch_sizes[len(batch)] += 1
+                self.queue_depths[_bucket(depth)] += 1
+
+            with self._tokenizer_lock:
+                try:
+                    items = [self.prepare(text) + (future,) for text, future in batch]
+                except Exception as e:
+                    for _, future in batch:
+                        future.set_exception(e)
+                    continue
+                # One forward pass per length bucket
+                for bucket, group in self.buckets.group(items).items():
+                    try:
+                        results = self._forward(bucket, group)
+                    except Exception as e:
+                        for _, _, future in group:
+                            future.set_exception(e)
+                        continue
+                    for (_, _, future), result in zip(group, results):
+                        future.set_result(result)
+
+    def stats(self):
+        """Counters and histograms for tuning batch size and wait time"""
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self.queue.qsize(),
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+                "queue_depth_histogram": dict(sorted(self.queue_depths.items())),
+                "max_tokens": self.max_tokens,
+                "length_buckets": self.buckets.stats(),
+            }
@@ -0,0 +1,144 @@
+import operator
+import re
+from collections import namedtuple
+
+# Keyword rules for the rule stage of the classifiers.
+# Rules are listed in priority order: when several rules fire on the same
+# text, the one listed first wins. Keywords are matched as whole words
+# (so "hi" no longer fires on "this"); a trailing "*" marks a stem that
+# also matches longer words ("thank*" -> "thanks", "thankful").
+
+# Rules for emotion_server_with_celebrities.py (dataset clusters)
+CELEBRITY_KEYWORD_RULES = [
+    # Happy/Positive
+    ('happy', ['happy', 'joy*', 'excited', 'great', 'wonderful', 'amazing']),
+    ('confident', ['confident', 'sure', 'certain', 'proud']),
+    ('humorous', ['funny', 'humor*', 'laugh*', 'hehe*', 'joke*']),
+
+    # Sad/Negative
+    ('sad', ['sad', 'depressed', 'unhappy', 'miserable', 'down']),
+    ('angry', ['angry', 'mad', 'furious', 'irritated', 'frustrated']),
+    ('scared', ['scared', 'fear*', 'afraid', 'terrified', 'anxious', 'worried']),
+
+    # Social
+    ('greeting', ['hello', 'hi', 'hey', 'morning', 'good morning']),
+    ('romantic', ['love*', 'romantic', 'romance', 'passionate']),
+    ('curious', ['curious', 'curiosity', 'ask*', 'question*', 'wonder*']),
+    ('confused', ['confus*', 'doubt*', 'uncertain', 'puzzled']),
+
+    # Intent-based
+    ('story', ['story', 'stories', 'tale*', 'narrative']),
+    ('insult', ['insult*', 'stupid', 'idiot', 'dumb', 'ego']),
+    ('casual', ['casual', 'normal', 'regular', 'ordinary']),
+    ('bye', ['bye', 'goodbye', 'see you', 'later']),
+    ('thanks', ['thank*', 'grateful']),
+    ('advice', ['advice', 'help*', 'suggest*', 'recommend*']),
+    ('song', ['sing', 'singing', 'song*', 'music', 'tune', 'melody']),
+]
+
+# Rules for emotion_server.py / emotion_server_local.py (raw labels)
+HYBRID_KEYWORD_RULES = [
+    ('greet', ['hello', 'hi', 'hey', 'morning', 'good morning']),
+    ('bye', ['bye', 'goodbye', 'see you', 'later']),
+    ('song', ['sing', 'singing', 'song*', 'music', 'tune', 'melody']),
+    ('thanks', ['thank*', 'thank you']),
+    ('joke', ['joke*', 'funny', 'humor*', 'laugh*']),
+    ('story', ['story', 'stories', 'tale*', 'narrative']),
+    ('advice', ['advice', 'help*', 'suggest*', 'recommend*']),
+    ('insult', ['insult*', 'stupid', 'idiot', 'dumb']),
+]
+
+# Result of a keyword match: the cluster label, the keyword that fired and
+# the priority (index) of the rule it belongs to
+KeywordMatch = namedtuple('KeywordMatch', ['label', 'keyword', 'priority'])
+
+
+# Word characters as a \b regex sees them; str.isalnum() is the same test
+# per character minus the underscore
+_WORD = re.compile(r'\w+')
+
+# Every ASCII character that isn't a word character -> space. A string
+# table translates faster than a dict; characters past it are kept.
+_NON_WORD_TO_SPACE = ''.join(chr(i) if _WORD.match(chr(i)) else ' ' for i in range(128))
+
+
+def text_words(text: str):
+    """Distinct \\w+ words of an already lowercased text.
+
+    str.translate() and str.split() do the work in C. An ASCII text is
+    then made of words only; otherwise tokens left with non-word
+    characters (non-ASCII punctuation, emoji) go through the regex, once
+    per distinct token.
+    """
+    text = text.translate(_NON_WORD_TO_SPACE)
+    tokens = set(text.split())
+    if text.isascii():
+        return tokens
+    glued = [token for token in tokens if not token.isalnum()]
+    if glued:
+        tokens.difference_update(glued)
+        for token in glued:
+            tokens.update(_WORD.findall(token))
+    return tokens
+
+
+class KeywordMatcher:
+    """Keyword rule table compiled into word lookups.
+
+    The text is split into its distinct words once. Single-word keywords
+    are one set intersection with them; stems ("thank*") are grouped by
+    their first few characters, so only words sharing such a head are
+    compared with a stem; multi-word keywords are only searched for when
+    all of their words occur. Nothing is re-scanned per keyword or per
+    text position. Of all hits, the one of the highest-priority rule is
+    returned.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        # Hits are (priority, keyword, KeywordMatch), so min() picks the best rule
+        self.exact = {}    # word -> hit
+        self.stems = {}    # stem -> hit
+        self.phrases = []  # (words that must occur, pattern, hit)
+        for priority, (label, keywords) in enumerate(rules):
+            for keyword in keywords:
+                keyword = ' '.join(keyword.lower().split())
+                is_stem = keyword.endswith('*')
+                words = keyword.rstrip('*').split()
+                hit = (priority, keyword, KeywordMatch(label, keyword, priority))
+                if len(words) > 1:
+                    pattern = r'\b' + r'\s+'.join(map(re.escape, words)) + (r'\w*' if is_stem else r'\b')
+                    required = frozenset(words[:-1] if is_stem else words)
+                    self.phrases.append((required, re.compile(pattern), hit))
+                elif is_stem:
+                    self.stems.setdefault(words[0], hit)
+                else:
+                    self.exact.setdefault(words[0], hit)
+        self.exact_words = frozenset(self.exact)
+        # Stems by their first `stem_head` characters (the shortest stem's length)
+        self.stem_head = min(map(len, self.stems), default=0)
+        self._stem_head_of = operator.itemgetter(slice(None, self.stem_head))
+        self.stem_heads = {}
+        for stem in self.stems:
+            self.stem_heads.setdefault(stem[:self.stem_head], []).append(stem)
+
+    def match(self, text: str):
+        """Return the KeywordMatch of the highest-priority rule, or None"""
+        lowered = text.lower()
+        words = text_words(lowered)
+        hits = [self.exact[word] for word in words & self.exact_words]
+        if self.stems:
+            head = self.stem_head
+            heads = self.stem_heads.keys() & map(self._stem_head_of, words)
+            if heads:
+                for word in [word for word in words if word[:head] in heads]:
+                    hits.extend(self.stems[stem] for stem in self.stem_heads[word[:head]] if word.startswith(stem))
+        for required, pattern, hit in self.phrases:
+            if required <= words and pattern.search(lowered):
+                hits.append(hit)
+        return min(hits)[2] if hits else None
+
+
+# Compiled once at import
+CELEBRITY_KEYWORD_MATCHER = KeywordMatcher(CELEBRITY_KEYWORD_RULES)
+HYBRID_KEYWORD_MATCHER = KeywordMatcher(HYBRID_KEYWORD_RULES)
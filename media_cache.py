@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+
+from file_lock import file_lock
+
+MEDIA_CACHE_DIR = os.environ.get(
+    "MEDIA_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "media_cache"),
+)
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def fetch_url(url: str, timeout: float = 20.0):
+    """(body, content_type) of a URL, following redirects"""
+    request = urllib.request.Request(url, headers={"User-Agent": "emotion-server-media-cache"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read(), response.headers.get_content_type()
+
+
+def parse_range(header: str, size: int):
+    """(start, end) inclusive for a single `bytes=` range, None if unsatisfiable.
+
+    Multi-range requests are answered with the first range only.
+    """
+    match = _RANGE.match(header.split(",")[0].strip())
+    if not match or size == 0:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start = max(0, size - int(last))
+        end = size - 1
+    else:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+class MediaCache:
+    """Content-addressed on-disk cache for the dataset's audio and image URLs.
+
+    Files are stored under their sha256 (`<dir>/<hh>/<hash>`), so a URL whose
+    content didn't change maps to the same file and the hash doubles as a
+    strong ETag. `url_index` maps origin URLs to hashes and is persisted in
+    `index.json`. Total size is bounded by `max_bytes`; the least recently
+    served files are evicted first and their URLs go back to the origin
+    until the next prefetch.
+
+    `origin_url` replaces scheme and host of every fetched URL (to point the
+    cache at a local stand-in server); `fetch` replaces the downloader.
+    Prefetches hold a file lock and start from the index on disk, so
+    pre-forked workers sharing the directory download each file once.
+    """
+
+    def __init__(self, cache_dir: str = MEDIA_CACHE_DIR, max_bytes: int = 512 * 1024 * 1024,
+                 base_url: str = "", origin_url: str = "", fetch=fetch_url):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.base_url = base_url.rstrip("/")
+        self.origin_url = origin_url.rstrip("/")
+        self.fetch = fetch
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.url_index = {}
+        self.files = OrderedDict()  # hash -> {"size", "content_type"}, least recently used first
+        self.total_bytes = 0
+        self.fetched = 0
+        self.failed = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _path(self, digest: str):
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def _load_index(self):
+        """Replace the in-memory index with the one on disk (kept if unreadable)"""
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        files = OrderedDict(
+            (digest, meta) for digest, meta in index.get("files", {}).items() if os.path.exists(self._path(digest))
+        )
+        url_index = {url: digest for url, digest in index.get("urls", {}).items() if digest in files}
+        with self._lock:
+            self.files = files
+            self.total_bytes = sum(meta["size"] for meta in files.values())
+            self.url_index = url_index
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with self._lock:
+            index = {"files": dict(self.files), "urls": dict(self.url_index)}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _origin(self, url: str):
+        if not self.origin_url:
+            return url
+        parts = urllib.parse.urlsplit(url)
+        return self.origin_url + urllib.parse.urlunsplit(("", "", parts.path, parts.query, ""))
+
+    def _evict(self):
+        """Drop least recently used files until under max_bytes (lock held)"""
+        while self.total_bytes > self.max_bytes and len(self.files) > 1:
+            digest, meta = self.files.popitem(last=False)
+            self.total_bytes -= meta["size"]
+            self.evictions += 1
+            self.url_index = {url: d for url, d in self.url_index.items() if d != digest}
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+    def add(self, url: str):
+        """Download one URL into the cache; returns its hash"""
+        body, content_type = self.fetch(self._origin(url))
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        with self._lock:
+            if digest not in self.files:
+                self.files[digest] = {"size": len(body), "content_type": content_type}
+                self.total_bytes += len(body)
+            self.files.move_to_end(digest)
+            self.url_index[url] = digest
+            self.fetched += 1
+            self._evict()
+        return digest
+
+    def prefetch(self, urls):
+        """Cache every URL not cached yet; failures keep the origin URL"""
+        with file_lock(os.path.join(self.cache_dir, "index.lock")):
+            # Another process may have fetched (or evicted) files meanwhile
+            self._load_index()
+            for url in dict.fromkeys(urls):
+                if not url or url in self.url_index:
+                    continue
+                try:
+                    self.add(url)
+                except Exception as e:
+                    self.failed += 1
+                    print(f"Media prefetch failed for {url}: {e}")
+            self._save_index()
+
+    def prefetch_in_background(self, urls, on_done=None):
+        """prefetch() in a daemon thread, then call on_done() if given"""
+        urls = list(urls)
+
+        def run():
+            self.prefetch(urls)
+            if on_done is not None:
+                on_done()
+
+        thread = threading.Thread(target=run, name="media-prefetch", daemon=True)
+        thread.start()
+        return thread
+
+    def local_url(self, url: str):
+        """The /media URL for a cached origin URL, or the URL itself"""
+        digest = self.url_index.get(url)
+        if digest is None:
+            return url
+        return f"{self.base_url}/media/{digest}"
+
+    def open(self, digest: str):
+        """(open binary file, meta) for a cached file, marking it recently used;
+        None if absent. Opened under the lock, so an eviction can't remove the
+        file in between; one another process already removed is dropped."""
+        with self._lock:
+            meta = self.files.get(digest)
+            if meta is None:
+                return None
+            try:
+                f = open(self._path(digest), "rb")
+            except FileNotFoundError:
+                del self.files[digest]
+                self.total_bytes -= meta["size"]
+                self.url_index = {url: d for url, d in self.url_index.items() if d != digest}
+                return None
+            self.files.move_to_end(digest)
+        return f, meta
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self.files),
+                "urls": len(self.url_index),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "fetched": self.fetched,
+                "failed": self.failed,
+                "evictions": self.evictions,
+            }
+
+
+def dataset_media_urls(dataset):
+    """Every audio and image URL in a {emotion: {character: response}} dataset"""
+    for characters in dataset.values():
+        for response in characters.values():
+            for field in ("audio", "image"):
+                if response.get(field):
+                    yield response[field]
+
+
+def iter_file_range(f, start: int, end: int, chunk_size: int = 64 * 1024):
+    """Yield bytes start..end (inclusive) of an open file, then close it"""
+    try:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
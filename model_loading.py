@@ -0,0 +1,126 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Representative input lengths for the warm-up pass: a greeting, a
+# typical chat line and a pasted paragraph
+WARMUP_TEXTS = [
+    "hi",
+    "honestly not sure how i feel about today, kind of tired but okay",
+    " ".join(["i keep thinking about what happened at work and it is hard to focus"] * 12),
+]
+
+
+def load_pipeline(task: str, model: str, backend: str = "torch", quantize: bool = False, num_threads: int = 0):
+    """Build a classifier for `task`; transformers/torch are imported here,
+    not at module import.
+
+    backend="onnx" runs the model with ONNX Runtime (optionally int8
+    quantized) and falls back to the PyTorch pipeline if that fails.
+    backend="stub" returns deterministic fake models with a simulated
+    forward-pass cost, for benchmarks and CI without model downloads.
+    """
+    if backend == "stub":
+        from stub_models import load_stub_pipeline
+        return load_stub_pipeline(task)
+    if backend == "onnx":
+        try:
+            from onnx_backend import load_onnx_pipeline
+            return load_onnx_pipeline(task, model, quantize=quantize, num_threads=num_threads)
+        except Exception as e:
+            print(f"ONNX backend unavailable for {model}, falling back to PyTorch: {e}")
+    from transformers import pipeline
+    return pipeline(task, model=model)
+
+
+class StartupTracker:
+    """Startup phase timings and readiness state for /readyz"""
+
+    def __init__(self, require_warmup: bool = True):
+        self.created_at = time.monotonic()
+        self.require_warmup = require_warmup
+        self.models = []
+        self.phase = "starting"
+        self.timings = {}
+        self.warmed_up = False
+        self.ready_after = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase_timer(self, name: str):
+        self.phase = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.timings[name] = round(time.perf_counter() - start, 3)
+
+    def is_ready(self):
+        if self.error or not all(model.loaded for model in self.models):
+            return False
+        return self.warmed_up or not self.require_warmup
+
+    def run_in_background(self, warm_up):
+        """Load and warm models on a daemon thread; the server answers meanwhile"""
+        def run():
+            try:
+                warm_up()
+                self.warmed_up = True
+                self.phase = "ready"
+                self.ready_after = round(time.monotonic() - self.created_at, 3)
+            except Exception as e:
+                self.error = str(e)
+                self.phase = "failed"
+                print(f"Model warm-up failed: {e}")
+
+        thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self):
+        with self._lock:
+            return {
+                "ready": self.is_ready(),
+                "phase": self.phase,
+                "models": {model.name: model.loaded for model in self.models},
+                "timings_s": dict(self.timings),
+                "ready_after_s": self.ready_after,
+                "error": self.error,
+            }
+
+
+class LazyModel:
+    """A model that is built on first use instead of at import.
+
+    Calling the LazyModel loads the model (once, thread-safe) and calls it,
+    so it can stand in for the pipeline object it wraps.
+    """
+
+    def __init__(self, name: str, loader, tracker: StartupTracker = None):
+        self.name = name
+        self.loader = loader
+        self.tracker = tracker
+        self.instance = None
+        self._lock = threading.Lock()
+        if tracker is not None:
+            tracker.models.append(self)
+
+    @property
+    def loaded(self):
+        return self.instance is not None
+
+    def get(self):
+        if self.instance is None:
+            with self._lock:
+                if self.instance is None:
+                    if self.tracker is not None:
+                        with self.tracker.phase_timer(f"load_{self.name}"):
+                            self.instance = self.loader()
+                    else:
+                        self.instance = self.loader()
+        return self.instance
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Hashed n-gram linear classifier: the tier between the keyword rules and the emotion model.
+
+Word unigrams/bigrams and character 3-/4-grams of the normalized text are
+hashed into a fixed number of buckets, and a multinomial logistic
+regression over those buckets predicts the cluster label. Prediction is a
+few dozen crc32s and one small matrix-vector product, all NumPy, so short
+chat messages are settled in microseconds; anything below the confidence
+threshold goes on to the transformer.
+
+Train it on labelled logs, or on the cascade's own output from
+classify_file.py (run without an n-gram model, so the labels come from the
+transformers), then check what share of traffic it would settle and how
+often it agrees with the cascade:
+
+    python classify_file.py chats.jsonl cascade.jsonl
+    python ngram_classifier.py train chats.jsonl --labels cascade.jsonl
+    python ngram_classifier.py report chats.jsonl --labels cascade.jsonl
+    python ngram_classifier.py train labelled.csv --label-field emotion
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import zlib
+
+import numpy as np
+
+from classify_file import DELIMITERS, input_format, read_rows
+from result_cache import normalize_text
+from zero_shot import softmax
+
+NGRAM_MODEL_PATH = os.environ.get(
+    "NGRAM_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ngram_model.npz")
+)
+DEFAULT_DIM = 1 << 18
+REPORT_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95)
+
+# Stages whose labels say nothing about the text (or came from this tier itself)
+UNTRAINABLE_STAGES = {"default", "ngram"}
+
+
+def ngram_hashes(text: str, dim: int = DEFAULT_DIM):
+    """Hash bucket of every n-gram of the normalized text, repeats included"""
+    text = normalize_text(text)
+    words = text.split()
+    # Word grams are prefixed so "sad" the word and "sad" the trigram hash apart
+    grams = ["\x01" + word for word in words]
+    grams += [f"\x01{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {text} "
+    grams += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    grams += [padded[i:i + 4] for i in range(len(padded) - 3)]
+    return np.array(list(map(zlib.crc32, map(str.encode, grams))), dtype=np.uint32) % dim
+
+
+def ngram_features(text: str, dim: int = DEFAULT_DIM):
+    """(indices, values): n-gram counts per bucket, scaled by 1/sqrt(number of n-grams)"""
+    hashes = ngram_hashes(text, dim)
+    indices, counts = np.unique(hashes, return_counts=True)
+    return indices, counts.astype(np.float32) / np.float32(np.sqrt(max(1, len(hashes))))
+
+
+class NgramClassifier:
+    """Multinomial logistic regression over hashed n-grams"""
+
+    def __init__(self, weights, bias, labels, version: str = None):
+        self.weights = weights  # (dim, classes) float32
+        self.bias = bias
+        self.labels = list(labels)
+        self.dim = weights.shape[0]
+        self.version = version
+
+    def logits(self, text: str):
+        # Summing the rows of repeated buckets equals weighting them by count, without np.unique
+        hashes = ngram_hashes(text, self.dim)
+        return self.weights[hashes].sum(axis=0) / np.float32(np.sqrt(max(1, len(hashes)))) + self.bias
+
+    def predict(self, text: str):
+        """(label, confidence)"""
+        logits = self.logits(text)
+        index = int(logits.argmax())
+        return self.labels[index], float(1.0 / np.exp(logits - logits[index]).sum())
+
+    @classmethod
+    def train(cls, texts, labels, dim: int = DEFAULT_DIM, epochs: int = 5, learning_rate: float = 0.5,
+              l2: float = 1e-6, seed: int = 0):
+        """SGD over the examples in a shuffled order per epoch; only the rows
+        of the touched buckets are updated, so an epoch is O(total n-grams)"""
+        classes = sorted(set(labels))
+        targets = np.array([classes.index(label) for label in labels])
+        features = [ngram_features(text, dim) for text in texts]
+        weights = np.zeros((dim, len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        step = 0
+        for _ in range(epochs):
+            for i in rng.permutation(len(features)):
+                indices, values = features[i]
+                gradient = softmax(values @ weights[indices] + bias)
+                gradient[targets[i]] -= 1.0
+                rate = learning_rate / (1.0 + step * 1e-5)
+                weights[indices] -= rate * (np.outer(values, gradient) + l2 * weights[indices])
+                bias -= rate * gradient
+                step += 1
+        return cls(weights, bias, classes)
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, weights=self.weights, bias=self.bias, labels=np.array(self.labels))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = NGRAM_MODEL_PATH):
+        """The saved model, or None if there is no model file"""
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            version = hashlib.sha1(f.read()).hexdigest()[:12]
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["weights"], data["bias"], [str(label) for label in data["labels"]], version)
+
+
+def read_cascade_labels(path: str):
+    """{row: (label, stage)} from a classify_file.py output file"""
+    labels = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        fmt = input_format(path)
+        if fmt in DELIMITERS:
+            records = csv.DictReader(f, delimiter=DELIMITERS[fmt])
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for record in records:
+            labels[int(record["row"])] = (record["label"], record["stage"])
+    return labels
+
+
+def load_examples(args):
+    """(texts, labels, stages) from labelled logs or from the input plus the cascade's output"""
+    cascade = read_cascade_labels(args.labels) if args.labels else None
+    texts, labels, stages = [], [], []
+    with open(args.input, newline="", encoding="utf-8") as f:
+        if cascade is None:
+            for label, text in read_rows(f, input_format(args.input, args.format), args.text_field, args.label_field):
+                if text and label:
+                    texts.append(text)
+                    labels.append(label)
+                    stages.append("labelled")
+            return texts, labels, stages
+        for row, (_, text) in enumerate(read_rows(f, input_format(args.input, args.format), args.text_field)):
+            label, stage = cascade.get(row, (None, None))
+            if text and label and stage not in UNTRAINABLE_STAGES:
+                texts.append(text)
+                labels.append(label)
+                stages.append(stage)
+    return texts, labels, stages
+
+
+def evaluate(model: NgramClassifier, texts, labels, thresholds=REPORT_THRESHOLDS):
+    """Per threshold: share of texts the tier settles and its agreement with the labels there"""
+    predictions = [model.predict(text) for text in texts]
+    report = []
+    for threshold in thresholds:
+        settled = [(label, predicted) for (predicted, confidence), label in zip(predictions, labels) if confidence >= threshold]
+        agreed = sum(1 for label, predicted in settled if label == predicted)
+        report.append({
+            "threshold": threshold,
+            "settled": round(len(settled) / len(texts), 4) if texts else 0.0,
+            "agreement": round(agreed / len(settled), 4) if settled else None,
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["train", "report"])
+    parser.add_argument("input", help="JSONL, CSV or TSV chat log")
+    parser.add_argument("--labels", help="classify_file.py output for this input: use the cascade's labels")
+    parser.add_argument("--label-field", default="label", help="label field or column when training on labelled logs")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--format", choices=["jsonl", *DELIMITERS])
+    parser.add_argument("--model", default=NGRAM_MODEL_PATH, help="model file to write (train) or read (report)")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM, help="hash buckets")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--learning-rate", type=float, default=0.5)
+    parser.add_argument("--holdout", type=float, default=0.1, help="share of examples held out to report on after training")
+    parser.add_argument("--include-keyword-rows", action="store_true",
+                        help="report on rows the keyword rules settle too (the tier never sees them when serving)")
+    args = parser.parse_args()
+
+    texts, labels, stages = load_examples(args)
+    if not texts:
+        raise SystemExit("No labelled examples found")
+
+    if args.command == "train":
+        order = np.random.default_rng(0).permutation(len(texts))
+        held = set(order[:int(len(texts) * args.holdout)].tolist())
+        train_rows = [i for i in range(len(texts)) if i not in held]
+        model = NgramClassifier.train([texts[i] for i in train_rows], [labels[i] for i in train_rows],
+                                      dim=args.dim, epochs=args.epochs, learning_rate=args.learning_rate)
+        model.save(args.model)
+        # Report on held-out rows the tier would actually see in serving
+        report_rows = [i for i in sorted(held) if args.include_keyword_rows or stages[i] != "keyword"]
+        print(json.dumps({
+            "model": args.model,
+            "examples": len(train_rows),
+            "labels": model.labels,
+            "holdout": len(report_rows),
+            "thresholds": evaluate(model, [texts[i] for i in report_rows], [labels[i] for i in report_rows]),
+        }, indent=2))
+        return
+
+    model = NgramClassifier.load(args.model)
+    if model is None:
+        raise SystemExit(f"No model at {args.model}")
+    report_rows = [i for i in range(len(texts)) if args.include_keyword_rows or stages[i] != "keyword"]
+    print(json.dumps({
+        "model": args.model,
+        "rows": len(report_rows),
+        "thresholds": evaluate(model, [texts[i] for i in report_rows], [labels[i] for i in report_rows]),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import os
+import threading
+
+import numpy as np
+
+from file_lock import file_lock
+from zero_shot import softmax
+
+# Exported (and quantized) models are cached here, one directory per model
+ONNX_CACHE_DIR = os.environ.get("ONNX_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models"))
+
+_export_lock = threading.Lock()
+
+
+def export_model(model_name: str, cache_dir: str = ONNX_CACHE_DIR, quantize: bool = False):
+    """Export a sequence-classification model to ONNX once and return the
+    path of the .onnx file to load (int8-quantized if requested).
+
+    Tokenizer and config are saved next to the model, so later runs load
+    everything from the cache without touching torch. Concurrent exports
+    (pre-forked workers) wait on a file lock and reuse the first one's files.
+    """
+    target = os.path.join(cache_dir, model_name.replace("/", "__"))
+    fp32_path = os.path.join(target, "model.onnx")
+    int8_path = os.path.join(target, "model.int8.onnx")
+
+    with _export_lock, file_lock(target + ".lock"):
+        if not os.path.exists(fp32_path):
+            import torch
+            from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+            print(f"Exporting {model_name} to ONNX...")
+            os.makedirs(target, exist_ok=True)
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+
+            class LogitsOnly(torch.nn.Module):
+                def __init__(self, inner):
+                    super().__init__()
+                    self.inner = inner
+
+                def forward(self, input_ids, attention_mask):
+                    return self.inner(input_ids=input_ids, attention_mask=attention_mask).logits
+
+            dummy = tokenizer(["hello there", "a slightly longer example sentence"], padding=True, return_tensors="pt")
+            tmp_path = fp32_path + ".tmp"
+            with torch.inference_mode():
+                torch.onnx.export(
+                    LogitsOnly(model),
+                    (dummy["input_ids"], dummy["attention_mask"]),
+                    tmp_path,
+                    input_names=["input_ids", "attention_mask"],
+                    output_names=["logits"],
+                    dynamic_axes={
+                        "input_ids": {0: "batch", 1: "sequence"},
+                        "attention_mask": {0: "batch", 1: "sequence"},
+                        "logits": {0: "batch"},
+                    },
+                    opset_version=14,
+                )
+            tokenizer.save_pretrained(target)
+            model.config.save_pretrained(target)
+            os.replace(tmp_path, fp32_path)
+
+        if not quantize:
+            return fp32_path
+
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            print(f"Quantizing {model_name} to int8...")
+            tmp_path = int8_path + ".tmp"
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, int8_path)
+        return int8_path
+
+
+class OnnxSequenceClassifier:
+    """ONNX Runtime session standing in for a transformers sequence-classification model"""
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoConfig
+
+        options = ort.SessionOptions()
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.config = AutoConfig.from_pretrained(os.path.dirname(model_path))
+        self.device = "cpu"
+
+    def numpy_logits(self, input_ids, attention_mask):
+        return self.session.run(["logits"], {
+            "input_ids": np.asarray(input_ids, dtype=np.int64),
+            "attention_mask": np.asarray(attention_mask, dtype=np.int64),
+        })[0]
+
+
+class OnnxTextClassificationPipeline:
+    """Drop-in for pipeline("text-classification") backed by ONNX Runtime.
+
+    Returns the top label per text: [{"label", "score"}] for one string,
+    one dict per text for a list.
+    """
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        from transformers import AutoTokenizer
+
+        self.model = OnnxSequenceClassifier(model_path, num_threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(model_path))
+
+    def __call__(self, inputs, batch_size: int = 1, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        batch_size = max(1, batch_size or 1)
+        results = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True, return_tensors="np")
+            probabilities = softmax(self.model.numpy_logits(encoded["input_ids"], encoded["attention_mask"]))
+            for row in probabilities:
+                index = int(row.argmax())
+                results.append({"label": self.model.config.id2label[index], "score": float(row[index])})
+        return results
+
+
+class OnnxZeroShotPipeline:
+    """Model + tokenizer pair for BatchedZeroShotClassifier backed by ONNX Runtime"""
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        from transformers import AutoTokenizer
+
+        self.model = OnnxSequenceClassifier(model_path, num_threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(model_path))
+
+
+def load_onnx_pipeline(task: str, model_name: str, quantize: bool = False, num_threads: int = 0):
+    """ONNX Runtime equivalent of load_pipeline(task, model_name)"""
+    model_path = export_model(model_name, quantize=quantize)
+    if task == "text-classification":
+        return OnnxTextClassificationPipeline(model_path, num_threads)
+    if task == "zero-shot-classification":
+        return OnnxZeroShotPipeline(model_path, num_threads)
+    raise ValueError(f"No ONNX backend for task {task!r}")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Pre-fork serving mode: load the models once, then fork N uvicorn workers.
+
+The parent imports the server module, loads both transformer models and
+freezes them for inference (eval mode, no grad, gc.freeze()), then binds
+the listening socket and forks the workers. Model weights live in pages
+the workers only read, so they stay shared copy-on-write and each extra
+worker costs only its private memory (interpreter state, activations,
+tokenizer caches) instead of another full copy of the weights.
+
+ONNX Runtime sessions can't be shared this way: a session's thread pool
+is created when it is built and doesn't survive fork(). With
+INFERENCE_BACKEND=onnx the parent loads nothing and every worker builds
+its own sessions after the fork (the exported files are shared on disk).
+
+Background jobs that write shared files run once: the sheet sync only in
+the first worker (PRIMARY_WORKER), media prefetch and dialogue embedding
+under file locks so one worker does the work and the others reuse it.
+
+    python prefork_server.py --workers 8
+    python prefork_server.py --module emotion_server_local --port 8001 --report-memory 60
+"""
+
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def freeze_for_inference(models):
+    """Put every loaded torch module in eval mode without gradients, then
+    move all existing Python objects out of the GC's reach so collections
+    in the workers don't write to (and un-share) the parent's pages"""
+    for lazy_model in models:
+        instance = lazy_model.instance
+        candidates = [getattr(instance, "model", None), getattr(getattr(instance, "pipe", None), "model", None)]
+        for module in candidates:
+            if module is not None and hasattr(module, "parameters"):
+                module.eval()
+                for parameter in module.parameters():
+                    parameter.requires_grad_(False)
+    gc.collect()
+    gc.freeze()
+
+
+def memory_report(pid: int):
+    """Rss/Pss/private memory of a process in MB, from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].rstrip(":") in ("Rss", "Pss", "Private_Clean", "Private_Dirty", "Shared_Clean", "Shared_Dirty"):
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    return {
+        "rss_mb": round(fields.get("Rss", 0.0)),
+        "pss_mb": round(fields.get("Pss", 0.0)),
+        "private_mb": round(fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0)),
+        "shared_mb": round(fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0)),
+    }
+
+
+def run_worker(server_module, sock, torch_threads: int, primary: bool):
+    import uvicorn
+
+    if not primary and hasattr(server_module, "PRIMARY_WORKER"):
+        server_module.PRIMARY_WORKER = False
+    options = getattr(server_module, "BACKEND_OPTIONS", {})
+    if options.get("backend", "torch") == "torch":
+        from inference_executor import set_torch_threads
+        set_torch_threads(torch_threads)
+    elif options.get("backend") == "onnx":
+        # Sessions are built in this worker, so they get the per-worker thread count
+        options["num_threads"] = torch_threads
+    config = uvicorn.Config(server_module.app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="emotion_server_with_celebrities", help="server module exposing `app`")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--torch-threads", type=int, default=0,
+                        help="torch (or ONNX Runtime) intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--report-memory", type=float, default=0,
+                        help="print per-process memory this many seconds after the workers start")
+    args = parser.parse_args()
+
+    # Tokenizer thread pools must not be started before fork
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    server_module = importlib.import_module(args.module)
+    backend = getattr(server_module, "BACKEND_OPTIONS", {}).get("backend", "torch")
+    if backend == "onnx":
+        # ORT thread pools don't survive fork(): each worker builds its own sessions
+        print("ONNX backend: models are loaded in each worker after fork (weights are not shared)")
+    else:
+        print(f"Loading {args.module} models in the parent process...")
+        start = time.perf_counter()
+        for lazy_model in server_module.startup.models:
+            lazy_model.get()
+        freeze_for_inference(server_module.startup.models)
+        print(f"✅ Models loaded and frozen in {time.perf_counter() - start:.1f}s")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+    workers = {}  # pid -> (start time, primary)
+
+    def spawn(primary: bool):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                run_worker(server_module, sock, torch_threads, primary)
+            finally:
+                os._exit(0)
+        workers[pid] = (time.monotonic(), primary)
+
+    for i in range(args.workers):
+        spawn(primary=i == 0)
+    print(f"🌐 {args.workers} workers serving on http://{args.host}:{args.port} ({torch_threads} torch threads each)")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    if args.report_memory > 0:
+        def report(signum, frame):
+            print(f"{'process':<16}{'RSS MB':>8}{'PSS MB':>8}{'private MB':>12}{'shared MB':>11}")
+            for name, pid in [("parent", os.getpid())] + [(f"worker {pid}", pid) for pid in workers]:
+                usage = memory_report(pid)
+                if usage:
+                    print(f"{name:<16}{usage['rss_mb']:>8}{usage['pss_mb']:>8}{usage['private_mb']:>12}{usage['shared_mb']:>11}")
+        signal.signal(signal.SIGALRM, report)
+        signal.alarm(max(1, int(args.report_memory)))
+
+    # Supervise: restart crashed workers (cheap, the models are already in memory)
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started, primary = workers.pop(pid, (None, False))
+        if not stopping:
+            print(f"⚠️ Worker {pid} exited with status {status}, restarting")
+            if started is not None and time.monotonic() - started < 1:
+                time.sleep(1)  # don't spin if workers die on startup
+            spawn(primary)
+
+    print("🛑 All workers stopped")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
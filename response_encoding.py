@@ -0,0 +1,38 @@
+import json
+
+# orjson is optional: a few times faster than the json module for small
+# dicts and strings. Both produce the same compact, UTF-8 encoded output.
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    JSON_LIBRARY = "orjson"
+except ImportError:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    JSON_LIBRARY = "json"
+
+
+def encode_fragment(celebrity: str, image_url: str, dialogue_text: str, audio_url: str) -> bytes:
+    """The static tail of a /predict body, closing brace included"""
+    return (
+        b',"celebrity":' + dumps(celebrity)
+        + b',"image_url":' + dumps(image_url)
+        + b',"dialogue_text":' + dumps(dialogue_text)
+        + b',"audio_url":' + dumps(audio_url)
+        + b"}"
+    )
+
+
+def encode_prediction(text: str, predicted_emotion: str, stage: str, degraded: bool, fragment: bytes) -> bytes:
+    """Splice the per-request fields in front of a pre-encoded fragment"""
+    return (
+        b'{"input":' + dumps(text)
+        + b',"predicted_emotion":' + dumps(predicted_emotion)
+        + b',"stage":' + dumps(stage)
+        + (b',"degraded":true' if degraded else b',"degraded":false')
+        + fragment
+    )
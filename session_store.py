@@ -0,0 +1,158 @@
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+# Per-entry overhead of the OrderedDict holding the sessions (hash slot, key
+# pointer, linked-list node), measured on CPython 3.x
+_DICT_ENTRY_BYTES = 104
+
+
+class Session:
+    """Fixed-size conversation state: the last served responses and moods.
+
+    `recent` is a ring of response keys (CelebrityIndex entry "key"), `moods`
+    a ring of interned label ids (0 = empty); `turns` is the write cursor
+    of both. Nothing grows after the session is created.
+    """
+
+    __slots__ = ("recent", "moods", "turns", "last_seen")
+
+    def __init__(self, recent_size: int, mood_size: int, now: float):
+        self.recent = array("I", bytes(4 * recent_size))
+        self.moods = bytearray(mood_size)
+        self.turns = 0
+        self.last_seen = now
+
+    def record(self, response_key: int, mood_id: int):
+        self.recent[self.turns % len(self.recent)] = response_key
+        self.moods[self.turns % len(self.moods)] = mood_id
+        self.turns += 1
+
+    def recent_keys(self):
+        """Served response keys, most recent first"""
+        size = len(self.recent)
+        return [self.recent[(self.turns - 1 - i) % size] for i in range(min(self.turns, size))]
+
+    def mood_ids(self):
+        """Mood ids oldest first"""
+        size = len(self.moods)
+        count = min(self.turns, size)
+        start = self.turns - count
+        return [self.moods[i % size] for i in range(start, self.turns)]
+
+
+class SessionStore:
+    """Per-session state for non-repeating replies, bounded in memory.
+
+    Sessions live in an OrderedDict in last-use order, so both limits are
+    enforced from the front in O(1) per evicted session: sessions idle for
+    longer than `idle_seconds` are dropped whenever the store is touched,
+    and the least recently used ones go when the store would exceed
+    `max_bytes`. Every session has the same size, so the byte cap is a
+    session count (bytes_per_session is reported in stats()).
+    """
+
+    def __init__(self, max_bytes: int = 128 * 1024 * 1024, idle_seconds: float = 1800,
+                 recent_size: int = 8, mood_size: int = 16, max_id_length: int = 128):
+        self.recent_size = recent_size
+        self.mood_size = mood_size
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self.max_id_length = max_id_length
+        self.bytes_per_session = self._session_bytes()
+        self.max_sessions = max(1, max_bytes // self.bytes_per_session)
+        self.labels = [None]  # mood id -> label; id 0 means "no mood yet"
+        self.label_ids = {}
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _session_bytes(self):
+        """Bytes one session costs: its objects, a max-length id and the dict entry"""
+        session = Session(self.recent_size, self.mood_size, time.monotonic())
+        return (
+            sys.getsizeof(session) + sys.getsizeof(session.recent) + sys.getsizeof(session.moods)
+            + sys.getsizeof(session.last_seen) + sys.getsizeof("x" * self.max_id_length) + _DICT_ENTRY_BYTES
+        )
+
+    def _mood_id(self, label: str) -> int:
+        mood_id = self.label_ids.get(label)
+        if mood_id is None:
+            if len(self.labels) > 255:
+                return 0
+            mood_id = self.label_ids[label] = len(self.labels)
+            self.labels.append(label)
+        return mood_id
+
+    def _evict_idle(self, now: float):
+        if self.idle_seconds <= 0:
+            return
+        sessions = self._sessions
+        while sessions:
+            oldest = next(iter(sessions.values()))
+            if now - oldest.last_seen < self.idle_seconds:
+                break
+            sessions.popitem(last=False)
+            self.evicted_idle += 1
+
+    def get(self, session_id: str):
+        """The session for an id, created if new; None for ids that are too long"""
+        if len(session_id) > self.max_id_length:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                if len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted_capacity += 1
+                session = self._sessions[session_id] = Session(self.recent_size, self.mood_size, now)
+                self.created += 1
+            else:
+                self._sessions.move_to_end(session_id)
+                session.last_seen = now
+            return session
+
+    def peek(self, session_id: str):
+        """The session for an id without creating or touching it"""
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            return self._sessions.get(session_id)
+
+    def record(self, session: Session, response_key: int, mood: str):
+        with self._lock:
+            session.record(response_key, self._mood_id(mood))
+
+    def describe(self, session: Session):
+        with self._lock:
+            return {
+                "turns": session.turns,
+                "mood_trajectory": [self.labels[mood_id] for mood_id in session.mood_ids()],
+                "idle_seconds": round(time.monotonic() - session.last_seen, 3),
+                "bytes": self.bytes_per_session,
+            }
+
+    def stats(self):
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "bytes_per_session": self.bytes_per_session,
+                "bytes": len(self._sessions) * self.bytes_per_session,
+                "max_bytes": self.max_bytes,
+                "idle_seconds": self.idle_seconds,
+                "recent_size": self.recent_size,
+                "mood_size": self.mood_size,
+                "created": self.created,
+                "evicted_idle": self.evicted_idle,
+                "evicted_capacity": self.evicted_capacity,
+            }
@@ -0,0 +1,47 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesces concurrent async calls with the same key into one.
+
+    The first caller for a key starts the work as a task; callers that
+    arrive with the same key while it runs wait on that task instead of
+    starting their own. Each waiter awaits it through asyncio.shield, so a
+    cancelled waiter (a client that went away) never cancels the work the
+    others are waiting for. The key is forgotten as soon as the task ends;
+    later callers start fresh (and usually hit the result cache instead).
+
+    Only used from the event loop thread, so no lock is needed.
+    """
+
+    def __init__(self):
+        self.in_flight = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def _done(self, key, task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        # Mark a failure as retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key, fn):
+        """(result, shared): await fn() once per key; shared is True for joiners"""
+        task = self.in_flight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.started += 1
+            task = asyncio.ensure_future(fn())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(task), shared
+
+    def stats(self):
+        return {
+            "in_flight": len(self.in_flight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
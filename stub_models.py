@@ -0,0 +1,108 @@
+import os
+import time
+import zlib
+
+import numpy as np
+
+from zero_shot import softmax
+
+# Simulated forward-pass cost: a fixed part plus a part per (padded) token
+STUB_LATENCY_MS = float(os.environ.get("STUB_LATENCY_MS", "5"))
+STUB_LATENCY_PER_TOKEN_MS = float(os.environ.get("STUB_LATENCY_PER_TOKEN_MS", "0.02"))
+
+EMOTION_LABELS = ["anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"]
+NLI_LABELS = ["contradiction", "neutral", "entailment"]
+
+
+class StubConfig:
+    def __init__(self, labels):
+        self.id2label = dict(enumerate(labels))
+        self.label2id = {label: i for i, label in enumerate(labels)}
+
+
+class StubTokenizer:
+    """Whitespace tokenizer with the slice of the transformers API the server uses"""
+
+    model_max_length = 512
+    pad_token_id = 1
+
+    def __init__(self):
+        self.vocab = {}
+
+    def encode(self, text: str, add_special_tokens: bool = True):
+        ids = []
+        for word in text.lower().split():
+            token_id = zlib.crc32(word.encode("utf-8")) % 50000 + 3
+            self.vocab[token_id] = word
+            ids.append(token_id)
+        return [0] + ids[:self.model_max_length - 2] + [2] if add_special_tokens else ids
+
+    def decode(self, ids):
+        return " ".join(self.vocab.get(token_id, "") for token_id in ids if token_id > 2)
+
+    def num_special_tokens_to_add(self, pair: bool = False):
+        return 4 if pair else 2
+
+    def build_inputs_with_special_tokens(self, first, second=None):
+        if second is None:
+            return [0] + first + [2]
+        return [0] + first + [2, 2] + second + [2]
+
+
+class StubSequenceClassifier:
+    """Deterministic pseudo-logits per input row, with a simulated forward-pass cost"""
+
+    def __init__(self, labels):
+        self.config = StubConfig(labels)
+        self.device = "cpu"
+
+    def numpy_logits(self, input_ids, attention_mask):
+        input_ids = np.asarray(input_ids, dtype=np.int64)
+        time.sleep((STUB_LATENCY_MS + STUB_LATENCY_PER_TOKEN_MS * input_ids.size) / 1000.0)
+        logits = np.empty((len(input_ids), len(self.config.id2label)), dtype=np.float32)
+        for i, (row, mask) in enumerate(zip(input_ids, np.asarray(attention_mask))):
+            rng = np.random.default_rng(zlib.crc32(row[mask > 0].tobytes()))
+            logits[i] = rng.normal(0.0, 2.0, logits.shape[1])
+        return logits
+
+
+class StubTextClassificationPipeline:
+    """Stand-in for pipeline("text-classification"), same output shape"""
+
+    def __init__(self, labels=EMOTION_LABELS):
+        self.model = StubSequenceClassifier(labels)
+        self.tokenizer = StubTokenizer()
+
+    def __call__(self, inputs, batch_size: int = 1, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        batch_size = max(1, batch_size or 1)
+        results = []
+        for start in range(0, len(texts), batch_size):
+            rows = [self.tokenizer.encode(text) for text in texts[start:start + batch_size]]
+            width = max(len(row) for row in rows)
+            input_ids = np.full((len(rows), width), self.tokenizer.pad_token_id, dtype=np.int64)
+            attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+            for i, row in enumerate(rows):
+                input_ids[i, :len(row)] = row
+                attention_mask[i, :len(row)] = 1
+            for logits in self.model.numpy_logits(input_ids, attention_mask):
+                probabilities = softmax(logits)
+                index = int(probabilities.argmax())
+                results.append({"label": self.model.config.id2label[index], "score": float(probabilities[index])})
+        return results
+
+
+class StubZeroShotPipeline:
+    """Model + tokenizer pair for BatchedZeroShotClassifier without a real NLI model"""
+
+    def __init__(self):
+        self.model = StubSequenceClassifier(NLI_LABELS)
+        self.tokenizer = StubTokenizer()
+
+
+def load_stub_pipeline(task: str):
+    if task == "text-classification":
+        return StubTextClassificationPipeline()
+    if task == "zero-shot-classification":
+        return StubZeroShotPipeline()
+    raise ValueError(f"No stub model for task {task!r}")
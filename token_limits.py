@@ -0,0 +1,83 @@
+import bisect
+import threading
+
+# Share of a capped input kept from the start; the rest comes from the end,
+# where chat messages tend to carry their point ("... anyway i'm exhausted")
+HEAD_FRACTION = 0.25
+
+
+def truncate_head_tail(ids, max_len: int, head_fraction: float = HEAD_FRACTION):
+    """Keep the first and last tokens of a too-long sequence, drop the middle"""
+    if max_len <= 0 or len(ids) <= max_len:
+        return ids
+    head = int(max_len * head_fraction)
+    tail = max_len - head
+    return ids[:head] + ids[len(ids) - tail:]
+
+
+def cap_text(tokenizer, text: str, max_tokens: int, head_fraction: float = HEAD_FRACTION):
+    """(text, token_count, truncated) with text cut to max_tokens tokens
+    (special tokens included) by head/tail truncation. The token count
+    is what the model will see, so callers can bucket by it.
+    """
+    special = tokenizer.num_special_tokens_to_add() if hasattr(tokenizer, "num_special_tokens_to_add") else 2
+    ids = tokenizer.encode(text, add_special_tokens=False)
+    if max_tokens <= 0 or len(ids) + special <= max_tokens:
+        return text, len(ids) + special, False
+    kept = truncate_head_tail(ids, max_tokens - special, head_fraction)
+    return tokenizer.decode(kept), max_tokens, True
+
+
+class LengthBuckets:
+    """Token-length buckets with padding-waste accounting.
+
+    `edges` are inclusive upper bounds, e.g. (16, 64, 128) gives the
+    buckets <=16, <=64, <=128 and >128. Padding waste is the share of
+    tokens in padded batches that are padding: 1 - real / padded.
+    """
+
+    def __init__(self, edges=()):
+        self.edges = tuple(sorted(edges))
+        self.names = [f"<={edge}" for edge in self.edges] + [f">{self.edges[-1]}" if self.edges else "all"]
+        self.counters = {name: {"batches": 0, "items": 0, "real_tokens": 0, "padded_tokens": 0} for name in self.names}
+        self.truncated = 0
+        self._lock = threading.Lock()
+
+    def bucket(self, length: int) -> str:
+        return self.names[bisect.bisect_left(self.edges, length)]
+
+    def group(self, items, length=lambda item: item[1]):
+        """{bucket: [items]} preserving order within each bucket"""
+        groups = {}
+        for item in items:
+            groups.setdefault(self.bucket(length(item)), []).append(item)
+        return groups
+
+    def record(self, bucket: str, lengths):
+        """Account one padded batch of sequences with these token lengths"""
+        with self._lock:
+            counters = self.counters[bucket]
+            counters["batches"] += 1
+            counters["items"] += len(lengths)
+            counters["real_tokens"] += sum(lengths)
+            counters["padded_tokens"] += max(lengths) * len(lengths)
+
+    def record_truncated(self, count: int = 1):
+        with self._lock:
+            self.truncated += count
+
+    def stats(self):
+        with self._lock:
+            real = sum(c["real_tokens"] for c in self.counters.values())
+            padded = sum(c["padded_tokens"] for c in self.counters.values())
+            buckets = {}
+            for name, c in self.counters.items():
+                buckets[name] = dict(c, padding_waste=1 - c["real_tokens"] / c["padded_tokens"] if c["padded_tokens"] else 0.0)
+            return {
+                "bucket_edges": list(self.edges),
+                "truncated": self.truncated,
+                "real_tokens": real,
+                "padded_tokens": padded,
+                "padding_waste": 1 - real / padded if padded else 0.0,
+                "buckets": buckets,
+            }
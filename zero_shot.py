@@ -0,0 +1,168 @@
+import numpy as np
+
+from keyword_rules import HYBRID_KEYWORD_RULES
+from token_limits import LengthBuckets, truncate_head_tail
+
+# Zero-shot intents that each emotion-model label makes more likely.
+# Used only as a cheap prior to pick which labels go through NLI.
+EMOTION_INTENT_PRIORS = {
+    'joy': ['joke', 'thanks', 'song', 'greet'],
+    'love': ['song', 'thanks', 'greet'],
+    'surprise': ['joke', 'story', 'random'],
+    'sadness': ['advice', 'bye', 'story'],
+    'fear': ['advice', 'story'],
+    'anger': ['insult', 'advice'],
+    'disgust': ['insult', 'random'],
+    'neutral': ['greet', 'random', 'story', 'advice'],
+}
+
+
+def zero_shot_priors(text: str, emotion_result=None, keyword_rules=HYBRID_KEYWORD_RULES):
+    """Cheap per-label prior for the zero-shot stage.
+
+    Partial keyword hits (substrings the whole-word matcher rejected,
+    e.g. "songbird") count 1.0; the emotion model's top prediction adds
+    its score to the intents listed in EMOTION_INTENT_PRIORS.
+    """
+    priors = {}
+    text_lower = text.lower()
+    for label, keywords in keyword_rules:
+        if any(word.rstrip('*') in text_lower for word in keywords):
+            priors[label] = priors.get(label, 0.0) + 1.0
+    if emotion_result:
+        for intent in EMOTION_INTENT_PRIORS.get(emotion_result['label'], ()):
+            priors[intent] = priors.get(intent, 0.0) + emotion_result['score']
+    return priors
+
+
+def softmax(logits):
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def model_logits(model, input_ids, attention_mask):
+    """Logits as a numpy array from a torch model or an ONNX Runtime model"""
+    if hasattr(model, "numpy_logits"):
+        return model.numpy_logits(input_ids, attention_mask)
+    import torch
+    with torch.inference_mode():
+        output = model(
+            input_ids=torch.from_numpy(input_ids).to(model.device),
+            attention_mask=torch.from_numpy(attention_mask).to(model.device),
+        )
+    return output.logits.float().cpu().numpy()
+
+
+class BatchedZeroShotClassifier:
+    """Zero-shot classification with every hypothesis scored in one padded batch.
+
+    Wraps a transformers zero-shot-classification pipeline and reuses its
+    model and tokenizer. The premise is tokenized once and paired with
+    hypothesis token ids that are cached per label, and all pairs for a
+    chunk of texts go through the NLI model in a single forward pass.
+    With `top_k` set, only the `top_k` labels ranked by the caller's
+    priors are scored. Output matches the pipeline's
+    {"sequence", "labels", "scores"} dicts.
+
+    Premises longer than `max_tokens` keep their head and tail. Many
+    sequences are sorted by length before chunking, so each padded batch
+    holds similar lengths; padding waste per row-length bucket is in stats().
+    """
+
+    def __init__(self, pipe, top_k: int = 0, hypothesis_template: str = "This example is {}.",
+                 max_tokens: int = 0, bucket_edges=()):
+        self.pipe = pipe
+        self.model = pipe.model
+        self.tokenizer = pipe.tokenizer
+        self.top_k = top_k
+        self.hypothesis_template = hypothesis_template
+        self.max_tokens = max_tokens
+        self.buckets = LengthBuckets(bucket_edges)
+        self.entailment_id = self._entailment_id()
+        self._hypothesis_ids = {}
+
+    def _entailment_id(self):
+        for label, index in self.model.config.label2id.items():
+            if label.lower().startswith("entail"):
+                return index
+        return -1
+
+    def _hypothesis(self, label: str):
+        ids = self._hypothesis_ids.get(label)
+        if ids is None:
+            ids = self.tokenizer.encode(self.hypothesis_template.format(label), add_special_tokens=False)
+            self._hypothesis_ids[label] = ids
+        return ids
+
+    def select_labels(self, candidate_labels, priors=None):
+        """Keep the top_k labels by prior; all labels when there is no prior"""
+        if not priors or self.top_k <= 0 or self.top_k >= len(candidate_labels):
+            return list(candidate_labels)
+        order = sorted(range(len(candidate_labels)), key=lambda i: (-priors.get(candidate_labels[i], 0.0), i))
+        return [candidate_labels[i] for i in sorted(order[:self.top_k])]
+
+    def _premise_ids(self, premise: str):
+        ids = self.tokenizer.encode(premise, add_special_tokens=False)
+        if 0 < self.max_tokens < len(ids):
+            self.buckets.record_truncated()
+            ids = truncate_head_tail(ids, self.max_tokens)
+        return ids
+
+    def _pair_rows(self, premise_ids, labels):
+        max_length = self.tokenizer.model_max_length
+        special = self.tokenizer.num_special_tokens_to_add(pair=True)
+        rows = []
+        for label in labels:
+            hypothesis_ids = self._hypothesis(label)
+            # Truncate only the premise, as the pipeline does (head and tail kept)
+            limit = max(0, max_length - len(hypothesis_ids) - special)
+            rows.append(self.tokenizer.build_inputs_with_special_tokens(truncate_head_tail(premise_ids, limit), hypothesis_ids))
+        return rows
+
+    def _forward(self, rows):
+        width = max(len(row) for row in rows)
+        self.buckets.record(self.buckets.bucket(width), [len(row) for row in rows])
+        input_ids = np.full((len(rows), width), self.tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+        for i, row in enumerate(rows):
+            input_ids[i, :len(row)] = row
+            attention_mask[i, :len(row)] = 1
+        return model_logits(self.model, input_ids, attention_mask)[:, self.entailment_id]
+
+    def __call__(self, sequences, candidate_labels, batch_size: int = 1, priors=None, **kwargs):
+        single = isinstance(sequences, str)
+        if single:
+            sequences = [sequences]
+            priors = [priors]
+        elif priors is None:
+            priors = [None] * len(sequences)
+
+        premise_ids = [self._premise_ids(premise) for premise in sequences]
+        # Chunks of similar-length premises pad less than chunks in input order
+        order = sorted(range(len(sequences)), key=lambda i: len(premise_ids[i]))
+        results = [None] * len(sequences)
+        batch_size = max(1, batch_size or 1)
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            chunk_labels = [self.select_labels(candidate_labels, priors[i]) for i in chunk]
+
+            # Every (premise, hypothesis) pair of the chunk in one padded batch
+            rows = []
+            for i, labels in zip(chunk, chunk_labels):
+                rows.extend(self._pair_rows(premise_ids[i], labels))
+            entailment = self._forward(rows)
+
+            offset = 0
+            for i, labels in zip(chunk, chunk_labels):
+                scores = softmax(entailment[offset:offset + len(labels)]).tolist()
+                offset += len(labels)
+                ranked = sorted(zip(labels, scores), key=lambda pair: pair[1], reverse=True)
+                results[i] = {
+                    "sequence": sequences[i],
+                    "labels": [label for label, _ in ranked],
+                    "scores": [score for _, score in ranked],
+                }
+        return results[0] if single else results
+
+    def stats(self):
+        return {"max_tokens": self.max_tokens, "length_buckets": self.buckets.stats()}